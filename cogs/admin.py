@@ -1,7 +1,8 @@
 from discord.ext import commands
 import discord
 from discord import app_commands
-from models.database import Session, AdminRole
+from models.database import session_for, AdminRole, set_feed_channel, set_api_enabled
+from utils.deferral import deferred, respond
 
 class AdminCommands(commands.Cog):
     """Commands for managing unicycle admin roles"""
@@ -12,6 +13,7 @@ class AdminCommands(commands.Cog):
     @app_commands.command()
     @app_commands.guild_only()
     @app_commands.describe(role="The role to add as an admin role")
+    @deferred()
     async def add_admin_role(self, interaction: discord.Interaction, role: discord.Role) -> None:
         """Add a role as a unicycle admin role"""
         print(f"\nProcessing add_admin_role command:")
@@ -21,7 +23,7 @@ class AdminCommands(commands.Cog):
         try:
             if not interaction.guild_id:
                 print("No guild ID available")
-                await interaction.response.send_message("Could not verify guild context. Please try again.", ephemeral=True)
+                await respond(interaction, "Could not verify guild context. Please try again.", ephemeral=True)
                 return
                 
             # Get the guild directly from the bot
@@ -47,12 +49,12 @@ class AdminCommands(commands.Cog):
             
         except Exception as e:
             print(f"Error during guild/member fetch: {e}")
-            await interaction.response.send_message("An error occurred while verifying permissions. Please try again.", ephemeral=True)
+            await respond(interaction, "An error occurred while verifying permissions. Please try again.", ephemeral=True)
             return
             
         if not guild or not member:
             print("Could not get guild or member context")
-            await interaction.response.send_message("Could not verify permissions. Please try again.", ephemeral=True)
+            await respond(interaction, "Could not verify permissions. Please try again.", ephemeral=True)
             return
 
         # Check permissions
@@ -61,9 +63,7 @@ class AdminCommands(commands.Cog):
             print(f"Is Owner: {guild.owner_id == member.id}")
             print(f"Is Admin: {member.guild_permissions.administrator}")
             
-            # Add the admin role to the database here
             print("Permission check passed - proceeding with adding admin role")
-            await interaction.response.send_message(f"Added {role.name} as an admin role.", ephemeral=True)
         else:
             print("User lacks required permissions")
             print(f"Guild Owner ID: {guild.owner_id}")
@@ -71,22 +71,23 @@ class AdminCommands(commands.Cog):
             print(f"Is Owner: {guild.owner_id == member.id}")
             print(f"Admin Permission: {member.guild_permissions.administrator}")
             print(f"All Permissions: {member.guild_permissions}")
-            await interaction.response.send_message("Only server administrators can add admin roles!", ephemeral=True)
+            await respond(interaction, "Only server administrators can add admin roles!", ephemeral=True)
+            return
 
-        session = Session()
+        session = session_for(interaction.guild_id)
         try:
-            existing = session.query(AdminRole).filter_by(role_id=str(role.id)).first()
+            existing = session.query(AdminRole).filter_by(guild_id=str(guild.id), role_id=str(role.id)).first()
             if existing:
-                await interaction.response.send_message(f"Role {role.mention} is already an admin role!", ephemeral=True)
+                await respond(interaction, f"Role {role.mention} is already an admin role!", ephemeral=True)
                 return
 
-            admin_role = AdminRole(role_id=str(role.id))
+            admin_role = AdminRole(guild_id=str(guild.id), role_id=str(role.id))
             session.add(admin_role)
             session.commit()
-            await interaction.response.send_message(f"Added {role.mention} as an admin role.", ephemeral=True)
+            await respond(interaction, f"Added {role.mention} as an admin role.", ephemeral=True)
         except Exception as e:
             print(f"Error adding admin role: {e}")
-            await interaction.response.send_message("Failed to add admin role.", ephemeral=True)
+            await respond(interaction, "Failed to add admin role.", ephemeral=True)
         finally:
             session.close()
 
@@ -103,9 +104,9 @@ class AdminCommands(commands.Cog):
             await interaction.response.send_message("Only server administrators can remove admin roles!", ephemeral=True)
             return
 
-        session = Session()
+        session = session_for(interaction.guild_id)
         try:
-            admin_role = session.query(AdminRole).filter_by(role_id=str(role.id)).first()
+            admin_role = session.query(AdminRole).filter_by(guild_id=str(interaction.guild.id), role_id=str(role.id)).first()
             if not admin_role:
                 await interaction.response.send_message(f"Role {role.mention} is not an admin role!", ephemeral=True)
                 return
@@ -127,9 +128,9 @@ class AdminCommands(commands.Cog):
             await interaction.response.send_message("This command can only be used in a server!", ephemeral=True)
             return
 
-        session = Session()
+        session = session_for(interaction.guild_id)
         try:
-            admin_roles = session.query(AdminRole).all()
+            admin_roles = session.query(AdminRole).filter_by(guild_id=str(interaction.guild.id)).all()
             if not admin_roles:
                 await interaction.response.send_message("No admin roles are configured.", ephemeral=True)
                 return
@@ -156,6 +157,67 @@ class AdminCommands(commands.Cog):
         finally:
             session.close()
 
+    @app_commands.command()
+    @app_commands.guild_only()
+    @app_commands.describe(channel="The channel to post unicycle changes in (leave empty to turn the feed off)")
+    async def set_feed_channel(self, interaction: discord.Interaction, channel: discord.TextChannel | None = None) -> None:
+        """Set the channel that logs every unicycle change"""
+        if not interaction.guild or not isinstance(interaction.user, discord.Member):
+            await interaction.response.send_message("Could not verify your permissions.", ephemeral=True)
+            return
+
+        if not (interaction.guild.owner_id == interaction.user.id or interaction.user.guild_permissions.administrator):
+            await interaction.response.send_message("Only server administrators can set the feed channel!", ephemeral=True)
+            return
+
+        if channel:
+            permissions = channel.permissions_for(interaction.guild.me)
+            if not (permissions.send_messages and permissions.embed_links):
+                await interaction.response.send_message(
+                    f"I need permission to send messages and embed links in {channel.mention}!", 
+                    ephemeral=True
+                )
+                return
+
+        try:
+            set_feed_channel(str(interaction.guild.id), str(channel.id) if channel else None)
+            if channel:
+                await interaction.response.send_message(f"Unicycle changes will be posted in {channel.mention}.", ephemeral=True)
+            else:
+                await interaction.response.send_message("The unicycle activity feed is turned off.", ephemeral=True)
+        except Exception as e:
+            print(f"Error setting feed channel: {e}")
+            await interaction.response.send_message("Failed to set the feed channel.", ephemeral=True)
+
+    @app_commands.command()
+    @app_commands.guild_only()
+    @app_commands.describe(enabled="Whether the bot's inventory API may serve this server's unicycles")
+    async def set_api_access(self, interaction: discord.Interaction, enabled: bool) -> None:
+        """Allow or block the inventory API for this server"""
+        if not interaction.guild or not isinstance(interaction.user, discord.Member):
+            await interaction.response.send_message("Could not verify your permissions.", ephemeral=True)
+            return
+
+        if not (interaction.guild.owner_id == interaction.user.id or interaction.user.guild_permissions.administrator):
+            await interaction.response.send_message("Only server administrators can change API access!", ephemeral=True)
+            return
+
+        try:
+            set_api_enabled(str(interaction.guild.id), enabled)
+            api = self.bot.get_cog("InventoryApi")
+            if api:
+                api.forget_guild(str(interaction.guild.id))
+            if enabled:
+                await interaction.response.send_message(
+                    "The inventory API can now serve this server's unicycles, including owner and custodian user IDs.", 
+                    ephemeral=True
+                )
+            else:
+                await interaction.response.send_message("The inventory API no longer serves this server.", ephemeral=True)
+        except Exception as e:
+            print(f"Error changing API access: {e}")
+            await interaction.response.send_message("Failed to change API access.", ephemeral=True)
+
 async def setup(bot: commands.Bot) -> None:
     """Add the cog to the bot"""
     await bot.add_cog(AdminCommands(bot))
\ No newline at end of file
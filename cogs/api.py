@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import json
+import os
+from aiohttp import web
+from discord.ext import commands
+from models.database import session_for, Unicycle, guild_data_version, api_enabled
+from utils.metrics import metrics
+from utils.render_cache import RenderCache
+
+# The API only runs when a port is configured. It listens on localhost unless told otherwise.
+API_PORT = os.getenv('UNICYCLE_API_PORT')
+API_HOST = os.getenv('UNICYCLE_API_HOST', '127.0.0.1')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+API_CACHE_SIZE = 512
+
+def unicycle_json(unicycle: Unicycle) -> dict:
+    """Public representation of a unicycle, without internal IDs"""
+    return {
+        'number': unicycle.guild_specific_id,
+        'name': unicycle.name_str,
+        'description': unicycle.description_str,
+        'owner_id': unicycle.owner_id_str,
+        'custody_id': unicycle.custody_id_str,
+        'due_at': unicycle.due_at.isoformat() + "Z" if unicycle.due_at else None
+    }
+
+def list_page(guild_id: str, cursor: int, limit: int) -> dict:
+    """One page of a guild's unicycles after the given unicycle number"""
+    session = session_for(guild_id)
+    try:
+        unicycles = session.query(Unicycle).filter(
+            Unicycle.guild_id == guild_id,
+            Unicycle.guild_specific_id > cursor
+        ).order_by(Unicycle.guild_specific_id).limit(limit + 1).all()
+        page = unicycles[:limit]
+        return {
+            'unicycles': [unicycle_json(unicycle) for unicycle in page],
+            'next_cursor': str(page[-1].guild_specific_id) if len(unicycles) > limit else None
+        }
+    finally:
+        session.close()
+
+def unicycle_detail(guild_id: str, number: int) -> dict | None:
+    session = session_for(guild_id)
+    try:
+        unicycle = session.query(Unicycle).filter_by(guild_id=guild_id, guild_specific_id=number).first()
+        return unicycle_json(unicycle) if unicycle else None
+    finally:
+        session.close()
+
+class InventoryApi(commands.Cog):
+    """Read-only JSON API over each guild's unicycles, served from the bot's event loop.
+
+    Responses carry a strong ETag derived from the guild's data version, so
+    clients polling with If-None-Match get a 304 without touching the database.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.runner = None
+        self.cache = RenderCache("api", API_CACHE_SIZE)
+        self.opted_in = {}  # guild_id -> whether the guild allows the API, loaded on first request
+
+    async def cog_load(self) -> None:
+        if not API_PORT:
+            return
+        app = web.Application()
+        app.router.add_get('/guilds/{guild_id}/unicycles', self.get_unicycles)
+        app.router.add_get('/guilds/{guild_id}/unicycles/{number}', self.get_unicycle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, API_HOST, int(API_PORT)).start()
+        print(f"Inventory API listening on http://{API_HOST}:{API_PORT}")
+
+    async def cog_unload(self) -> None:
+        if self.runner:
+            await self.runner.cleanup()
+
+    def forget_guild(self, guild_id: str) -> None:
+        """Drop a guild's cached opt-in after its admins change it"""
+        self.opted_in.pop(guild_id, None)
+        self.cache.invalidate_guild(guild_id)
+
+    async def guild_id_from(self, request: web.Request) -> str:
+        guild_id = request.match_info['guild_id']
+        # Only serve guilds the bot is currently in whose admins opted in.
+        # Others get the same 404, so guild IDs can't be probed.
+        if not guild_id.isdigit() or not self.bot.get_guild(int(guild_id)):
+            raise web.HTTPNotFound(text=json.dumps({'error': "Guild not found"}), content_type='application/json')
+        if guild_id not in self.opted_in:
+            self.opted_in[guild_id] = await asyncio.to_thread(api_enabled, guild_id)
+        if not self.opted_in[guild_id]:
+            metrics.incr("api.not_opted_in")
+            raise web.HTTPNotFound(text=json.dumps({'error': "Guild not found"}), content_type='application/json')
+        return guild_id
+
+    async def respond(self, request: web.Request, guild_id: str, load) -> web.Response:
+        """Serve a JSON body built by `load`, honouring If-None-Match"""
+        version = await asyncio.to_thread(guild_data_version, guild_id)
+        digest = hashlib.sha256(request.path_qs.encode()).hexdigest()[:16]
+        etag = f'"{guild_id}-{version}-{digest}"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            metrics.incr("api.not_modified")
+            return web.Response(status=304, headers=headers)
+
+        cache_key = (guild_id, request.path_qs, version)
+        body = self.cache.get(cache_key)
+        if body is None:
+            data = await asyncio.to_thread(load)
+            if data is None:
+                raise web.HTTPNotFound(text=json.dumps({'error': "Unicycle not found"}), content_type='application/json')
+            body = json.dumps(data)
+            self.cache.put(cache_key, body)
+
+        metrics.incr("api.ok")
+        return web.Response(text=body, content_type='application/json', headers=headers)
+
+    async def get_unicycles(self, request: web.Request) -> web.Response:
+        guild_id = await self.guild_id_from(request)
+        try:
+            cursor = int(request.query.get('cursor', '0'))
+            limit = min(int(request.query.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        except ValueError:
+            raise web.HTTPBadRequest(text=json.dumps({'error': "cursor and limit must be integers"}), content_type='application/json')
+        if limit < 1:
+            raise web.HTTPBadRequest(text=json.dumps({'error': "limit must be positive"}), content_type='application/json')
+        return await self.respond(request, guild_id, lambda: list_page(guild_id, cursor, limit))
+
+    async def get_unicycle(self, request: web.Request) -> web.Response:
+        guild_id = await self.guild_id_from(request)
+        number = request.match_info['number']
+        if not number.isdigit():
+            raise web.HTTPNotFound(text=json.dumps({'error': "Unicycle not found"}), content_type='application/json')
+        return await self.respond(request, guild_id, lambda: unicycle_detail(guild_id, int(number)))
+
+async def setup(bot: commands.Bot) -> None:
+    """Add the cog to the bot"""
+    await bot.add_cog(InventoryApi(bot))
@@ -0,0 +1,136 @@
+import asyncio
+import random
+from discord.ext import commands
+import discord
+from models.database import feed_channel_id
+from utils.events import events, InventoryEvent
+from utils.metrics import metrics
+
+# Changes are collected for this many seconds and posted together
+FEED_WINDOW = 5.0
+# Changes kept per guild while waiting to be posted, beyond that they are only counted
+FEED_MAX_PENDING = 1000
+# Discord limits embed descriptions to 4096 characters
+FEED_EMBED_LIMIT = 4096
+FEED_LINE_LIMIT = 300
+# Retries of a failed post, waiting FEED_RETRY_BASE * 2^attempt seconds (at most FEED_RETRY_MAX) in between
+FEED_MAX_RETRIES = 5
+FEED_RETRY_BASE = 2.0
+FEED_RETRY_MAX = 120.0
+
+def feed_embeds(lines: list[str], overflow: int) -> list[discord.Embed]:
+    """Pack feed lines into as few embeds as the description limit allows"""
+    if overflow:
+        lines = lines + [f"...and {overflow} more changes"]
+    chunks = [[]]
+    length = 0
+    for line in lines:
+        if len(line) > FEED_LINE_LIMIT:
+            line = line[:FEED_LINE_LIMIT - 3] + "..."
+        if chunks[-1] and length + len(line) + 1 > FEED_EMBED_LIMIT:
+            chunks.append([])
+            length = 0
+        chunks[-1].append(line)
+        length += len(line) + 1
+
+    return [
+        discord.Embed(title="Unicycle Activity", description="\n".join(chunk), color=discord.Color.blue())
+        for chunk in chunks if chunk
+    ]
+
+class ActivityFeed(commands.Cog):
+    """Posts every unicycle change to the guild's feed channel.
+
+    Changes are published on the event bus by the unicycle commands. Each
+    guild gets a flusher task that waits FEED_WINDOW seconds, then posts
+    everything collected so far as one embed, so bursts of bulk activity
+    become a few messages. Changes arriving while a post is in flight or
+    being retried are collected into the next one.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.pending = {}  # guild_id -> feed lines waiting to be posted
+        self.overflow = {}  # guild_id -> changes dropped because too many were waiting
+        self.flushers = {}  # guild_id -> flusher task
+
+    async def cog_load(self) -> None:
+        events.subscribe(self.queue_event)
+
+    async def cog_unload(self) -> None:
+        events.unsubscribe(self.queue_event)
+        for task in self.flushers.values():
+            task.cancel()
+
+    def queue_event(self, event: InventoryEvent) -> None:
+        pending = self.pending.setdefault(event.guild_id, [])
+        if len(pending) < FEED_MAX_PENDING:
+            pending.append(f"<t:{int(event.timestamp)}:T> {event.summary}")
+        else:
+            self.overflow[event.guild_id] = self.overflow.get(event.guild_id, 0) + 1
+            metrics.incr("feed.overflow")
+        if event.guild_id not in self.flushers:
+            self.flushers[event.guild_id] = asyncio.create_task(self.flush_guild(event.guild_id))
+
+    async def flush_guild(self, guild_id: str) -> None:
+        try:
+            while self.pending.get(guild_id):
+                await asyncio.sleep(FEED_WINDOW)
+                lines = self.pending.pop(guild_id, [])
+                overflow = self.overflow.pop(guild_id, 0)
+                try:
+                    await self.post(guild_id, lines, overflow)
+                except Exception as e:
+                    print(f"Error posting activity feed for guild {guild_id}: {e}")
+        finally:
+            self.flushers.pop(guild_id, None)
+
+    async def post(self, guild_id: str, lines: list[str], overflow: int) -> None:
+        channel_id = await asyncio.to_thread(feed_channel_id, guild_id)
+        if not channel_id:
+            return
+        channel = self.bot.get_channel(int(channel_id))
+        if channel is None:
+            print(f"Activity feed channel {channel_id} of guild {guild_id} not found")
+            metrics.incr("feed.undeliverable", len(lines))
+            return
+
+        posted = [await self.send_with_backoff(channel, embed) for embed in feed_embeds(lines, overflow)]
+        if all(posted):
+            metrics.incr("feed.events_posted", len(lines))
+
+    async def send_with_backoff(self, channel, embed: discord.Embed) -> bool:
+        """Send one feed message, backing off and retrying on rate limits and server errors"""
+        for attempt in range(FEED_MAX_RETRIES + 1):
+            try:
+                await channel.send(embed=embed)
+                metrics.incr("feed.messages_sent")
+                return True
+            except (discord.Forbidden, discord.NotFound) as e:
+                # Missing permissions or a deleted channel, retrying won't help
+                print(f"Cannot post to activity feed channel {channel.id}: {e}")
+                metrics.incr("feed.undeliverable")
+                return False
+            except discord.RateLimited as e:
+                wait = e.retry_after
+            except discord.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    print(f"Failed to post to activity feed channel {channel.id}: {e}")
+                    metrics.incr("feed.failed")
+                    return False
+                wait = 0
+
+            if attempt == FEED_MAX_RETRIES:
+                break
+            # Jitter keeps guilds that were rate limited together from retrying together
+            delay = min(FEED_RETRY_BASE * 2 ** attempt, FEED_RETRY_MAX)
+            metrics.incr("feed.retries")
+            await asyncio.sleep(max(wait, delay) + random.uniform(0, delay / 2))
+
+        print(f"Giving up on activity feed post to channel {channel.id} after {FEED_MAX_RETRIES} retries")
+        metrics.incr("feed.failed")
+        return False
+
+async def setup(bot: commands.Bot) -> None:
+    """Add the cog to the bot"""
+    await bot.add_cog(ActivityFeed(bot))
@@ -0,0 +1,211 @@
+import asyncio
+from discord.ext import commands, tasks
+import discord
+from discord import app_commands
+from models.database import migrate_shared_to_guild_files, reconcile_guild_counters, stored_guild_ids, DB_MODE
+from utils.backup import BACKUP_DIR, BACKUP_INTERVAL_HOURS, create_snapshot, list_snapshots, verify_snapshot
+from utils.deferral import deferred, respond
+from utils.metrics import metrics
+from utils.photos import collect_photo_garbage
+
+class MaintenanceCommands(commands.Cog):
+    """Operational commands reserved for the bot owner"""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.backup_lock = asyncio.Lock()  # Only one snapshot at a time
+
+    async def cog_load(self) -> None:
+        self.scheduled_backup.start()
+        self.reconcile_inventory.start()
+        self.collect_photos.start()
+
+    async def cog_unload(self) -> None:
+        self.scheduled_backup.cancel()
+        self.reconcile_inventory.cancel()
+        self.collect_photos.cancel()
+
+    async def is_bot_owner(self, interaction: discord.Interaction) -> bool:
+        return await self.bot.is_owner(interaction.user)
+
+    @app_commands.command(name="bot_stats")
+    async def show_bot_stats(self, interaction: discord.Interaction) -> None:
+        """Show command latency and deferral statistics"""
+        if not await self.is_bot_owner(interaction):
+            await interaction.response.send_message("Only the bot owner can view bot stats!", ephemeral=True)
+            return
+
+        snapshot = metrics.snapshot()
+        embed = discord.Embed(title="Bot Stats", color=discord.Color.blue())
+
+        for name, timing in sorted(snapshot['timings'].items()):
+            if not name.startswith("commands."):
+                continue
+            command = name[len("commands."):-len(".latency")]
+            invocations = snapshot['counters'].get(f"commands.{command}.invocations", 0)
+            deferred = snapshot['counters'].get(f"commands.{command}.deferred", 0)
+            embed.add_field(
+                name=command,
+                value=(
+                    f"Calls: {invocations}, deferred: {deferred}\n"
+                    f"p50 {timing['p50']:.2f}s / p95 {timing['p95']:.2f}s / "
+                    f"p99 {timing['p99']:.2f}s / max {timing['max']:.2f}s"
+                ),
+                inline=False
+            )
+
+        other_counters = [
+            f"{name}: {value}" for name, value in sorted(snapshot['counters'].items())
+            if not name.startswith("commands.")
+        ]
+        if other_counters:
+            embed.add_field(name="Counters", value="\n".join(other_counters)[:1024], inline=False)
+
+        if not embed.fields:
+            embed.description = "No stats recorded yet."
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command()
+    @app_commands.describe(overwrite="Replace guild files left by an earlier migration with the current shared data")
+    @deferred()
+    async def migrate_guild_databases(self, interaction: discord.Interaction, overwrite: bool = False) -> None:
+        """Copy each guild's data from the shared database into per-guild files"""
+        if not await self.is_bot_owner(interaction):
+            await respond(interaction, "Only the bot owner can migrate databases!", ephemeral=True)
+            return
+
+        if DB_MODE == 'per_guild':
+            # The guild files are live, copying the shared database over them would lose changes
+            await respond(interaction, "The bot is already using per-guild databases, so there is nothing to migrate.", ephemeral=True)
+            return
+
+        try:
+            # Copying can take a while for big databases, so keep it off the event loop
+            copied, skipped = await asyncio.to_thread(migrate_shared_to_guild_files, overwrite)
+        except Exception as e:
+            print(f"Error migrating guild databases: {e}")
+            await respond(interaction, f"Error migrating guild databases: {str(e)}", ephemeral=True)
+            return
+
+        message = f"Migrated {sum(copied.values())} rows into {len(copied)} guild database files."
+        if skipped:
+            message += f" Skipped {len(skipped)} guilds that already have a file, use overwrite to replace them."
+        message += " Set UNICYCLE_DB_MODE=per_guild and restart the bot to start using them. Changes made between now and the restart are not copied."
+        await respond(interaction, message, ephemeral=True)
+
+    async def take_snapshot(self):
+        async with self.backup_lock:
+            # The online backup API copies page batches in a worker thread, so commands keep running
+            return await asyncio.to_thread(create_snapshot)
+
+    @tasks.loop(hours=BACKUP_INTERVAL_HOURS)
+    async def scheduled_backup(self) -> None:
+        try:
+            await self.take_snapshot()
+        except Exception as e:
+            metrics.incr("backup.failures")
+            print(f"Error creating scheduled backup: {e}")
+
+    @scheduled_backup.before_loop
+    async def before_scheduled_backup(self) -> None:
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(hours=24)
+    async def reconcile_inventory(self) -> None:
+        """Rebuild the inventory counters from the unicycles table in case they drifted"""
+        drifted = 0
+        for guild_id in await asyncio.to_thread(stored_guild_ids):
+            try:
+                # One short transaction per guild
+                if await asyncio.to_thread(reconcile_guild_counters, guild_id):
+                    drifted += 1
+                    print(f"Inventory counters for guild {guild_id} had drifted and were rebuilt")
+            except Exception as e:
+                print(f"Error reconciling inventory counters for guild {guild_id}: {e}")
+        metrics.incr("stats.reconcile_runs")
+        metrics.incr("stats.reconcile_drifted_guilds", drifted)
+
+    @reconcile_inventory.before_loop
+    async def before_reconcile_inventory(self) -> None:
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(hours=24)
+    async def collect_photos(self) -> None:
+        """Delete stored photos that no unicycle uses any more"""
+        try:
+            removed = await collect_photo_garbage()
+            if removed:
+                print(f"Removed {removed} unused photo files")
+        except Exception as e:
+            print(f"Error collecting unused photos: {e}")
+
+    @collect_photos.before_loop
+    async def before_collect_photos(self) -> None:
+        await self.bot.wait_until_ready()
+
+    @app_commands.command()
+    @deferred()
+    async def backup_now(self, interaction: discord.Interaction) -> None:
+        """Take a database backup snapshot immediately"""
+        if not await self.is_bot_owner(interaction):
+            await respond(interaction, "Only the bot owner can take backups!", ephemeral=True)
+            return
+
+        try:
+            snapshot = await self.take_snapshot()
+        except Exception as e:
+            metrics.incr("backup.failures")
+            print(f"Error creating backup: {e}")
+            await respond(interaction, f"Error creating backup: {str(e)}", ephemeral=True)
+            return
+
+        await respond(interaction, f"Created backup snapshot `{snapshot.name}`.", ephemeral=True)
+
+    @app_commands.command()
+    @app_commands.describe(snapshot="Snapshot name to verify (defaults to the newest)")
+    @deferred()
+    async def verify_backup(self, interaction: discord.Interaction, snapshot: str | None = None) -> None:
+        """Open a backup snapshot and compare its row counts per guild with the live data"""
+        if not await self.is_bot_owner(interaction):
+            await respond(interaction, "Only the bot owner can verify backups!", ephemeral=True)
+            return
+
+        snapshots = {path.name: path for path in list_snapshots()}
+        if not snapshots:
+            await respond(interaction, f"No backup snapshots found in `{BACKUP_DIR}`.", ephemeral=True)
+            return
+        name = snapshot or max(snapshots)
+        if name not in snapshots:
+            await respond(interaction, f"Snapshot `{name}` not found!", ephemeral=True)
+            return
+
+        try:
+            report = await asyncio.to_thread(verify_snapshot, snapshots[name])
+        except Exception as e:
+            print(f"Error verifying backup: {e}")
+            await respond(interaction, f"Error verifying backup: {str(e)}", ephemeral=True)
+            return
+
+        lines = []
+        for file_name, guilds in report['files'].items():
+            for guild_id, tables in sorted(guilds.items()):
+                counts = ", ".join(
+                    f"{table} {saved}" + (f" (live {live})" if live != saved else "")
+                    for table, (saved, live) in tables.items()
+                )
+                lines.append(f"`{file_name}` {guild_id}: {counts}")
+
+        embed = discord.Embed(
+            title=f"Backup {name}",
+            description="\n".join(lines)[:4000] or "The snapshot holds no guild data.",
+            color=discord.Color.red() if report['errors'] else discord.Color.green()
+        )
+        embed.add_field(name="Files checked", value=str(len(report['files']) + len(report['errors'])), inline=True)
+        if report['errors']:
+            embed.add_field(name="Integrity errors", value="\n".join(report['errors'])[:1024], inline=False)
+        await respond(interaction, embed=embed, ephemeral=True)
+
+async def setup(bot: commands.Bot) -> None:
+    """Add the cog to the bot"""
+    await bot.add_cog(MaintenanceCommands(bot))
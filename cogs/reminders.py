@@ -0,0 +1,125 @@
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+from discord.ext import commands
+import discord
+from models.database import session_for, Unicycle, outstanding_loans, claim_reminder, release_reminder, utcnow
+from utils.metrics import metrics
+
+# Reminder DMs are sent in batches, spaced out to stay clear of Discord's rate limits
+REMINDER_BATCH_SIZE = 10
+REMINDER_SEND_INTERVAL = 1.0
+REMINDER_BATCH_PAUSE = 5.0
+# How long to wait before retrying a reminder that failed to send
+REMINDER_RETRY_DELAY = timedelta(minutes=15)
+
+class ReminderScheduler(commands.Cog):
+    """Sends custodians a DM when a lent unicycle becomes due.
+
+    Outstanding loans are kept in a min-heap of (send_at, guild_id, unicycle id,
+    due_at) loaded from the due_at index at startup, and the task sleeps until
+    the earliest one. Each reminder is claimed in the database before it is sent,
+    so restarts neither skip overdue loans nor send a reminder twice.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.heap = []
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    async def cog_load(self) -> None:
+        self.task = asyncio.create_task(self.run())
+
+    async def cog_unload(self) -> None:
+        if self.task:
+            self.task.cancel()
+
+    def schedule(self, due_at: datetime, guild_id: str, unicycle_id: int, send_at: datetime | None = None) -> None:
+        """Add a loan to the heap, waking the scheduler if it is now the earliest"""
+        entry = (send_at or due_at, guild_id, unicycle_id, due_at)
+        heapq.heappush(self.heap, entry)
+        if self.heap[0] == entry:
+            self.wakeup.set()
+
+    async def run(self) -> None:
+        await self.bot.wait_until_ready()
+        try:
+            loans = await asyncio.to_thread(outstanding_loans)
+        except Exception as e:
+            print(f"Error loading outstanding loans: {e}")
+            loans = []
+        # Merge with anything scheduled while loading
+        self.heap.extend((due_at, guild_id, unicycle_id, due_at) for due_at, guild_id, unicycle_id in loans)
+        heapq.heapify(self.heap)
+        print(f"Loaded {len(loans)} outstanding loans")
+
+        while True:
+            self.wakeup.clear()
+            if not self.heap:
+                await self.wakeup.wait()
+                continue
+
+            delay = (self.heap[0][0] - utcnow()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = utcnow()
+            batch = []
+            while self.heap and self.heap[0][0] <= now and len(batch) < REMINDER_BATCH_SIZE:
+                batch.append(heapq.heappop(self.heap))
+            try:
+                await self.send_batch(batch)
+            except Exception as e:
+                print(f"Error sending reminders: {e}")
+            if self.heap and self.heap[0][0] <= utcnow():
+                await asyncio.sleep(REMINDER_BATCH_PAUSE)
+
+    async def send_batch(self, batch: list[tuple[datetime, str, int, datetime]]) -> None:
+        for _, guild_id, unicycle_id, due_at in batch:
+            if await self.send_reminder(due_at, guild_id, unicycle_id):
+                await asyncio.sleep(REMINDER_SEND_INTERVAL)
+
+    async def send_reminder(self, due_at: datetime, guild_id: str, unicycle_id: int) -> bool:
+        """Remind the custodian about one loan. Returns True if a DM was attempted"""
+        session = session_for(guild_id, create=False)
+        if session is None:
+            # The guild's data was purged after the loan was queued
+            return False
+        try:
+            # Skips loans that were returned, re-lent or already reminded since being queued
+            if not claim_reminder(session, unicycle_id, due_at):
+                session.rollback()
+                return False
+            session.commit()
+
+            unicycle = session.get(Unicycle, unicycle_id)
+            guild = self.bot.get_guild(int(guild_id))
+            try:
+                custodian = self.bot.get_user(int(unicycle.custody_id_str)) or await self.bot.fetch_user(int(unicycle.custody_id_str))
+                owner = "the Club" if unicycle.owner_id_str == "Club" else f"<@{unicycle.owner_id_str}>"
+                await custodian.send(
+                    f"Reminder: '{unicycle.name_str}' (#{unicycle.guild_specific_id})"
+                    f"{f' from {guild.name}' if guild else ''} was due back to {owner} on {due_at:%Y-%m-%d %H:%M} UTC."
+                )
+                metrics.incr("reminders.sent")
+            except (discord.Forbidden, discord.NotFound):
+                # The custodian doesn't accept DMs or no longer exists, retrying won't help
+                metrics.incr("reminders.undeliverable")
+            except discord.HTTPException as e:
+                print(f"Failed to send reminder for unicycle {unicycle_id}: {e}")
+                metrics.incr("reminders.failed")
+                release_reminder(session, unicycle_id, due_at)
+                session.commit()
+                self.schedule(due_at, guild_id, unicycle_id, send_at=utcnow() + REMINDER_RETRY_DELAY)
+            return True
+        finally:
+            session.close()
+
+async def setup(bot: commands.Bot) -> None:
+    """Add the cog to the bot"""
+    await bot.add_cog(ReminderScheduler(bot))
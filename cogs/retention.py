@@ -0,0 +1,199 @@
+import asyncio
+import os
+from datetime import timedelta
+from discord.ext import commands, tasks
+import discord
+from discord import app_commands
+from models.database import (
+    Session, PendingPurge, DB_MODE, guild_engines, stored_guild_ids,
+    count_guild_rows, delete_guild_rows_batch, start_guild_epoch, reconcile_guild_counters, utcnow
+)
+from utils.deferral import deferred, respond
+from utils.metrics import metrics
+
+# How long a guild's data is kept after the bot is removed, in case it is re-added
+RETENTION_DAYS = int(os.getenv('UNICYCLE_PURGE_RETENTION_DAYS', '30'))
+# Rows deleted per transaction, and the pause between transactions so commands can write
+PURGE_BATCH_SIZE = 500
+PURGE_BATCH_PAUSE = 0.1
+
+class PurgeStopped(Exception):
+    """The guild re-added the bot or its purge was cancelled while it ran"""
+
+class RetentionTasks(commands.Cog):
+    """Purges data of guilds the bot has left once their retention window passes"""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    async def cog_load(self) -> None:
+        self.purge_due_guilds.start()
+
+    async def cog_unload(self) -> None:
+        self.purge_due_guilds.cancel()
+
+    def schedule_purge(self, guild_id: str) -> None:
+        session = Session()
+        try:
+            now = utcnow()
+            pending = session.get(PendingPurge, guild_id)
+            if pending:
+                return
+            session.add(PendingPurge(
+                guild_id=guild_id,
+                left_at=now,
+                purge_after=now + timedelta(days=RETENTION_DAYS)
+            ))
+            session.commit()
+            print(f"Scheduled purge of guild {guild_id} in {RETENTION_DAYS} days")
+        finally:
+            session.close()
+
+    def cancel_purge(self, guild_id: str) -> None:
+        session = Session()
+        try:
+            pending = session.get(PendingPurge, guild_id)
+            if pending:
+                session.delete(pending)
+                session.commit()
+                print(f"Cancelled purge of guild {guild_id}")
+        finally:
+            session.close()
+
+    def purge_still_due(self, guild_id: str) -> bool:
+        if self.bot.get_guild(int(guild_id)):
+            return False
+        session = Session()
+        try:
+            return session.get(PendingPurge, guild_id) is not None
+        finally:
+            session.close()
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.schedule_purge(str(guild.id))
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild) -> None:
+        # Re-added within the retention window, so keep the data
+        self.cancel_purge(str(guild.id))
+
+    def forget_rendered_pages(self, guild_id: str) -> None:
+        """Drop cached listings and API responses of a guild whose data is being purged"""
+        unicycle_commands = self.bot.get_cog("UnicycleCommands")
+        if unicycle_commands:
+            unicycle_commands.list_cache.invalidate_guild(guild_id)
+        api = self.bot.get_cog("InventoryApi")
+        if api:
+            api.forget_guild(guild_id)
+
+    async def purge_guild(self, guild_id: str) -> int:
+        """Delete all of a guild's rows in bounded batches. Returns rows reclaimed"""
+        # New epochs before and after, so neither pages read mid-purge nor a re-added
+        # guild's fresh data can reuse the version of anything cached earlier
+        await asyncio.to_thread(start_guild_epoch, guild_id)
+        try:
+            return await self.delete_guild_data(guild_id)
+        finally:
+            await asyncio.to_thread(start_guild_epoch, guild_id)
+            self.forget_rendered_pages(guild_id)
+
+    async def delete_guild_data(self, guild_id: str) -> int:
+        reclaimed = 0
+        if not self.purge_still_due(guild_id):
+            raise PurgeStopped()
+        if DB_MODE == 'per_guild':
+            counts = await asyncio.to_thread(count_guild_rows, guild_id)
+            await asyncio.to_thread(guild_engines.drop, guild_id)
+            for table_name, count in counts.items():
+                metrics.incr(f"purge.rows_reclaimed.{table_name}", count)
+            reclaimed = sum(counts.values())
+        else:
+            while True:
+                # Re-checked between batches, as the bot may be re-added while a large guild is purged
+                if reclaimed and not self.purge_still_due(guild_id):
+                    # Keep the counters of the unicycles that are left in step
+                    await asyncio.to_thread(reconcile_guild_counters, guild_id)
+                    metrics.incr("purge.rows_reclaimed", reclaimed)
+                    raise PurgeStopped()
+                deleted = await asyncio.to_thread(delete_guild_rows_batch, guild_id, PURGE_BATCH_SIZE)
+                if deleted is None:
+                    break
+                table_name, count = deleted
+                metrics.incr(f"purge.rows_reclaimed.{table_name}", count)
+                reclaimed += count
+                await asyncio.sleep(PURGE_BATCH_PAUSE)
+
+        metrics.incr("purge.rows_reclaimed", reclaimed)
+        metrics.incr("purge.guilds_purged")
+        return reclaimed
+
+    @tasks.loop(minutes=10)
+    async def purge_due_guilds(self) -> None:
+        session = Session()
+        try:
+            due = [
+                pending.guild_id for pending in
+                session.query(PendingPurge).filter(PendingPurge.purge_after <= utcnow()).all()
+            ]
+        finally:
+            session.close()
+
+        for guild_id in due:
+            if self.bot.get_guild(int(guild_id)):
+                # The bot was re-added while it was offline
+                self.cancel_purge(guild_id)
+                continue
+            try:
+                reclaimed = await self.purge_guild(guild_id)
+                self.cancel_purge(guild_id)
+                print(f"Purged {reclaimed} rows of guild {guild_id}")
+            except PurgeStopped:
+                print(f"Stopped purging guild {guild_id}, it was re-added or its purge was cancelled")
+            except Exception as e:
+                print(f"Error purging guild {guild_id}: {e}")
+
+    @purge_due_guilds.before_loop
+    async def before_purge_due_guilds(self) -> None:
+        await self.bot.wait_until_ready()
+        # Catch guilds that removed the bot while it was offline
+        try:
+            stored = await asyncio.to_thread(stored_guild_ids)
+            for guild_id in stored:
+                if not self.bot.get_guild(int(guild_id)):
+                    self.schedule_purge(guild_id)
+        except Exception as e:
+            print(f"Error checking for departed guilds: {e}")
+
+    @app_commands.command()
+    @deferred()
+    async def purge_report(self, interaction: discord.Interaction) -> None:
+        """Dry run: show which guilds will be purged and how many rows they hold"""
+        if not await self.bot.is_owner(interaction.user):
+            await respond(interaction, "Only the bot owner can view the purge report!", ephemeral=True)
+            return
+
+        session = Session()
+        try:
+            pending = session.query(PendingPurge).order_by(PendingPurge.purge_after).all()
+        finally:
+            session.close()
+
+        embed = discord.Embed(title="Pending Guild Purges", color=discord.Color.blue())
+        for entry in pending[:25]:  # Discord limits embeds to 25 fields
+            counts = await asyncio.to_thread(count_guild_rows, entry.guild_id)
+            rows = ", ".join(f"{table}: {count}" for table, count in counts.items()) or "no rows"
+            embed.add_field(
+                name=f"Guild {entry.guild_id}",
+                value=f"Left {entry.left_at:%Y-%m-%d}, purge after {entry.purge_after:%Y-%m-%d %H:%M} UTC\n{rows}",
+                inline=False
+            )
+        if not pending:
+            embed.description = "No guilds are scheduled for purging."
+        embed.set_footer(text=f"Rows reclaimed since startup: {metrics.counter('purge.rows_reclaimed')}")
+
+        await respond(interaction, embed=embed, ephemeral=True)
+
+async def setup(bot: commands.Bot) -> None:
+    """Add the cog to the bot"""
+    await bot.add_cog(RetentionTasks(bot))
@@ -1,12 +1,184 @@
+import asyncio
+from datetime import timedelta
 import discord
 from discord import app_commands
 from discord.ext import commands
-from models.database import Session, Unicycle, AdminRole, get_next_guild_id
+from models.database import (
+    session_for, Unicycle, AdminRole, get_next_guild_id, compare_and_swap,
+    track_unicycle_change, rebuild_inventory_counters, inventory_stats, guild_data_version, utcnow,
+    release_photo
+)
+from utils.deferral import deferred, respond
+from utils.events import events
+from utils.photos import (
+    MAX_PHOTO_BYTES, PhotoTooLarge, store_photo, generate_thumbnail, shutdown_thumbnail_pool, photo_path, thumbnail_path
+)
+from utils.render_cache import RenderCache
+
+# Discord allows at most 25 fields per embed
+LIST_PAGE_SIZE = 25
+LIST_CACHE_SIZE = 256
+# Most unicycles a single bulk command may change
+MAX_BULK_UNICYCLES = 50
+
+def parse_unicycle_ids(spec: str) -> list[int]:
+    """Parse a list of unicycle numbers such as "1, 3, 5-8" """
+    ids = []
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        if not start.isdigit() or (end and not end.isdigit()):
+            raise ValueError(f"'{part}' is not a unicycle number or range")
+        first, last = int(start), int(end or start)
+        if last < first:
+            raise ValueError(f"'{part}' is not a valid range")
+        if len(ids) + last - first + 1 > MAX_BULK_UNICYCLES:
+            raise ValueError(f"You can change at most {MAX_BULK_UNICYCLES} unicycles at once")
+        ids.extend(range(first, last + 1))
+    if not ids:
+        raise ValueError("No unicycle numbers given")
+    return sorted(set(ids))
+
+def unicycle_label(number: int, name: str) -> str:
+    """How a unicycle is referred to in the activity feed"""
+    return f"#{number} **{discord.utils.escape_markdown(name)}**"
+
+def ownership_changes(unicycle: Unicycle, new_owner_id: str, acting_user_id: str) -> dict:
+    """Column changes for giving a unicycle a new owner"""
+    changes = {'owner_id': new_owner_id}
+    # If the current custodian is the old owner, update custody to the new owner
+    if unicycle.custody_id_str == unicycle.owner_id_str:
+        if new_owner_id != "Club":  # Only update custody if the new owner isn't Club
+            changes['custody_id'] = new_owner_id
+        else:
+            # If setting to Club ownership, set custody to the person making the change
+            changes['custody_id'] = acting_user_id
+    return changes
+
+class TransferConfirmation(discord.ui.View):
+    """Accept/decline buttons for a custody transfer of one or more unicycles.
+
+    `versions` maps each unicycle's primary key to the version it had when the
+    transfer was requested. Accepting applies every change in one transaction,
+    or none of them if any unicycle changed in the meantime.
+    """
+
+    def __init__(
+        self,
+        cog: 'UnicycleCommands',
+        guild_id: int,
+        target: discord.Member,
+        versions: dict[int, int],
+        label: str,
+        due_in_days: int | None = None
+    ):
+        super().__init__(timeout=300)  # 5 minute timeout
+        self.cog = cog
+        self.guild_id = guild_id
+        self.target = target
+        self.versions = versions
+        self.label = label
+        self.due_in_days = due_in_days  # Loan period, counted from when the transfer is accepted
+        # Serializes button presses so duplicate clicks are handled once
+        self.lock = asyncio.Lock()
+        self.outcome = None
+
+    async def finish(self, button_interaction: discord.Interaction, outcome: str):
+        self.outcome = outcome
+        for item in self.children:
+            item.disabled = True
+        try:
+            if button_interaction.message:
+                await button_interaction.message.edit(view=self)
+        except discord.HTTPException as e:
+            print(f"Failed to disable transfer buttons: {e}")
+        self.stop()
+
+    @discord.ui.button(label="Accept", style=discord.ButtonStyle.green)
+    async def accept(self, button_interaction: discord.Interaction, button: discord.ui.Button):
+        async with self.lock:
+            if self.outcome:
+                await button_interaction.response.send_message(f"This transfer was already {self.outcome}.", ephemeral=True)
+                return
+
+            # Create a new session for the button interaction
+            button_session = session_for(self.guild_id)
+            try:
+                # Get the current state of the unicycles
+                unicycles = button_session.query(Unicycle).filter(Unicycle.id.in_(self.versions)).all()
+                if len(unicycles) != len(self.versions):
+                    await button_interaction.response.send_message("Unicycle not found!", ephemeral=True)
+                    return
+
+                if button_interaction.user.id == self.target.id or await self.cog.is_admin(button_interaction, button_session):
+                    due_at = utcnow() + timedelta(days=self.due_in_days) if self.due_in_days else None
+                    # Described before committing, which expires the loaded rows
+                    feed_lines = [
+                        f"{unicycle_label(unicycle.guild_specific_id, unicycle.name_str)} went from <@{unicycle.custody_id_str}> to {self.target.mention}"
+                        for unicycle in unicycles
+                    ]
+                    # Update the custody, unless any unicycle changed since the request
+                    for unicycle in unicycles:
+                        if not compare_and_swap(button_session, unicycle, self.versions[unicycle.id], custody_id=str(self.target.id), due_at=due_at):
+                            button_session.rollback()
+                            await button_interaction.response.send_message(
+                                f"'{unicycle.name_str}' was changed after this transfer was requested, so the transfer was cancelled. Please request it again.",
+                                ephemeral=True
+                            )
+                            await self.finish(button_interaction, "cancelled")
+                            return
+                    button_session.commit()
+
+                    accepted_by = f" (accepted by {button_interaction.user.mention})" if button_interaction.user.id != self.target.id else ""
+                    for line in feed_lines:
+                        events.publish(self.guild_id, "transferred", line + (f", due back {due_at:%Y-%m-%d}" if due_at else "") + accepted_by)
+
+                    if due_at:
+                        scheduler = self.cog.bot.get_cog("ReminderScheduler")
+                        if scheduler:
+                            for unicycle_id in self.versions:
+                                scheduler.schedule(due_at, str(self.guild_id), unicycle_id)
+
+                    await button_interaction.response.send_message(
+                        f"Transfer of {self.label} to {self.target.mention} complete!"
+                        + (f" Due back on {due_at:%Y-%m-%d}." if due_at else ""), 
+                        ephemeral=True
+                    )
+                    await self.finish(button_interaction, "accepted")
+                else:
+                    await button_interaction.response.send_message("You cannot accept this transfer!", ephemeral=True)
+            finally:
+                button_session.close()
+
+    @discord.ui.button(label="Decline", style=discord.ButtonStyle.red)
+    async def decline(self, button_interaction: discord.Interaction, button: discord.ui.Button):
+        async with self.lock:
+            if self.outcome:
+                await button_interaction.response.send_message(f"This transfer was already {self.outcome}.", ephemeral=True)
+                return
+
+            button_session = session_for(self.guild_id)
+            try:
+                if button_interaction.user.id == self.target.id or await self.cog.is_admin(button_interaction, button_session):
+                    await button_interaction.response.send_message(
+                        f"Transfer of {self.label} declined.", 
+                        ephemeral=True
+                    )
+                    await self.finish(button_interaction, "declined")
+                else:
+                    await button_interaction.response.send_message("You cannot decline this transfer!", ephemeral=True)
+            finally:
+                button_session.close()
 
 class UnicycleCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.pending_transfers = {}  # Store pending transfer requests
+        self.list_cache = RenderCache("list_unicycles", LIST_CACHE_SIZE)
+
+    async def cog_unload(self) -> None:
+        shutdown_thumbnail_pool()
 
     async def unicycle_autocomplete(
         self,
@@ -17,7 +189,7 @@ class UnicycleCommands(commands.Cog):
         if not interaction.guild_id:
             return []
             
-        session = Session()
+        session = session_for(interaction.guild_id)
         try:
             # Filter unicycles by guild_id
             unicycles = session.query(Unicycle).filter_by(guild_id=str(interaction.guild_id)).all()
@@ -77,7 +249,7 @@ class UnicycleCommands(commands.Cog):
             await interaction.response.send_message("This command can only be used in a server!", ephemeral=True)
             return
             
-        session = Session()
+        session = session_for(interaction.guild_id)
         try:
             # Check if a unicycle with this name already exists in this guild
             existing = session.query(Unicycle).filter_by(
@@ -105,7 +277,9 @@ class UnicycleCommands(commands.Cog):
                 custody_id=str(interaction.user.id)
             )
             session.add(unicycle)
+            track_unicycle_change(session, guild_id, None, (unicycle.owner_id_str, unicycle.custody_id_str))
             session.commit()
+            events.publish(guild_id, "added", f"{interaction.user.mention} added {unicycle_label(next_id, name)}")
             await interaction.response.send_message(f"Unicycle '{name}' has been added!", ephemeral=True)
         except Exception as e:
             await interaction.response.send_message(f"Error adding unicycle: {str(e)}", ephemeral=True)
@@ -113,17 +287,26 @@ class UnicycleCommands(commands.Cog):
             session.close()
 
     @app_commands.command(name="transfer-unicycle", description="Transfer custody of a unicycle to another user")
-    @app_commands.describe(unicycle_id="The unicycle number (as shown in the list)")
+    @app_commands.describe(
+        unicycle_id="The unicycle number (as shown in the list)",
+        due_in_days="Lend the unicycle for this many days, after which the user is reminded to return it (optional)"
+    )
     @app_commands.autocomplete(unicycle_id=unicycle_autocomplete)
-    async def transfer_unicycle(self, interaction: discord.Interaction, unicycle_id: int, user: discord.Member):
+    async def transfer_unicycle(
+        self,
+        interaction: discord.Interaction,
+        unicycle_id: int,
+        user: discord.Member,
+        due_in_days: app_commands.Range[int, 1, 365] | None = None
+    ):
         # Debug statements:
-        print(f"transfer_unicycle called by user {interaction.user.id} in guild {interaction.guild_id} with unicycle_id {unicycle_id} and user {user.id}")
+        print(f"transfer_unicycle called by user {interaction.user.id} in guild {interaction.guild_id} with unicycle_id {unicycle_id}, user {user.id} and due_in_days {due_in_days}")
 
         if not interaction.guild_id:
             await interaction.response.send_message("This command can only be used in a server!", ephemeral=True)
             return
             
-        session = Session()
+        session = session_for(interaction.guild_id)
         try:
             # Filter by both guild-specific ID and guild_id
             unicycle = session.query(Unicycle).filter_by(
@@ -146,64 +329,18 @@ class UnicycleCommands(commands.Cog):
                 'to_user': user.id
             }
 
-            # Create confirmation buttons
-            outer_self = self  # Store reference to outer class
-            unicycle_id_str = str(unicycle.id)  # Store ID as string
-            
-            class ConfirmButtons(discord.ui.View):
-                def __init__(self):
-                    super().__init__(timeout=300)  # 5 minute timeout
-
-                @discord.ui.button(label="Accept", style=discord.ButtonStyle.green)
-                async def accept(self, button_interaction: discord.Interaction, button: discord.ui.Button):
-                    # Create a new session for the button interaction
-                    button_session = Session()
-                    try:
-                        # Get the current state of the unicycle
-                        current_unicycle = button_session.query(Unicycle).filter_by(id=int(unicycle_id_str)).first()
-                        if not current_unicycle:
-                            await button_interaction.response.send_message("Unicycle not found!", ephemeral=True)
-                            return
-
-                        if button_interaction.user.id == user.id or await outer_self.is_admin(button_interaction, button_session):
-                            # Get the unicycle values before modifying
-                            unicycle_name = current_unicycle.name_str
-                            # Update the custody
-                            current_unicycle.set_custody_id(str(user.id))
-                            button_session.commit()
-                            await button_interaction.response.send_message(
-                                f"Transfer of '{unicycle_name}' to {user.mention} complete!", 
-                                ephemeral=True
-                            )
-                            self.stop()
-                        else:
-                            await button_interaction.response.send_message("You cannot accept this transfer!", ephemeral=True)
-                    finally:
-                        button_session.close()
-
-                @discord.ui.button(label="Decline", style=discord.ButtonStyle.red)
-                async def decline(self, button_interaction: discord.Interaction, button: discord.ui.Button):
-                    button_session = Session()
-                    try:
-                        current_unicycle = button_session.query(Unicycle).filter_by(id=int(unicycle_id_str)).first()
-                        if not current_unicycle:
-                            await button_interaction.response.send_message("Unicycle not found!", ephemeral=True)
-                            return
-
-                        if button_interaction.user.id == user.id or await outer_self.is_admin(button_interaction, button_session):
-                            await button_interaction.response.send_message(
-                                f"Transfer of '{current_unicycle.name_str}' declined.", 
-                                ephemeral=True
-                            )
-                            self.stop()
-                        else:
-                            await button_interaction.response.send_message("You cannot decline this transfer!", ephemeral=True)
-                    finally:
-                        button_session.close()
-
-            view = ConfirmButtons()
+            # Create confirmation buttons, tied to the version the transfer was requested against
+            view = TransferConfirmation(
+                self,
+                interaction.guild_id,
+                user,
+                {unicycle.id: unicycle.version},
+                f"'{unicycle.name_str}'",
+                due_in_days
+            )
+            loan_text = f" for {due_in_days} day{'s' if due_in_days != 1 else ''}" if due_in_days else ""
             await interaction.response.send_message(
-                f"{user.mention}, {interaction.user.mention} wants to transfer '{unicycle.name}' to you. Do you accept?",
+                f"{user.mention}, {interaction.user.mention} wants to transfer '{unicycle.name}' to you{loan_text}. Do you accept?",
                 view=view
             )
 
@@ -212,18 +349,264 @@ class UnicycleCommands(commands.Cog):
         finally:
             session.close()
 
+    async def load_unicycles(self, interaction: discord.Interaction, session, unicycle_ids: str) -> list[Unicycle] | None:
+        """Look up a list/range of unicycle numbers with a single query, replying with the problem if any are invalid"""
+        try:
+            ids = parse_unicycle_ids(unicycle_ids)
+        except ValueError as e:
+            await respond(interaction, f"{str(e)}!", ephemeral=True)
+            return None
+
+        unicycles = session.query(Unicycle).filter(
+            Unicycle.guild_id == str(interaction.guild_id),
+            Unicycle.guild_specific_id.in_(ids)
+        ).order_by(Unicycle.guild_specific_id).all()
+
+        missing = sorted(set(ids) - {unicycle.guild_specific_id for unicycle in unicycles})
+        if missing:
+            await respond(
+                interaction,
+                "Unicycles not found in this server: " + ", ".join(f"#{number}" for number in missing), 
+                ephemeral=True
+            )
+            return None
+        return unicycles
+
+    @staticmethod
+    def describe_unicycles(unicycles: list[Unicycle], limit: int = 1500) -> str:
+        text = ", ".join(f"#{unicycle.guild_specific_id} '{unicycle.name_str}'" for unicycle in unicycles)
+        return text if len(text) <= limit else text[:limit].rsplit(", ", 1)[0] + ", ..."
+
+    @app_commands.command(name="transfer-unicycles", description="Transfer custody of several unicycles to another user at once")
+    @app_commands.describe(
+        unicycle_ids="The unicycle numbers, e.g. '1, 3, 5-8'",
+        user="The user to transfer the unicycles to",
+        due_in_days="Lend the unicycles for this many days, after which the user is reminded to return them (optional)"
+    )
+    @deferred()
+    async def transfer_unicycles(
+        self,
+        interaction: discord.Interaction,
+        unicycle_ids: str,
+        user: discord.Member,
+        due_in_days: app_commands.Range[int, 1, 365] | None = None
+    ):
+        # Debug statements:
+        print(f"transfer_unicycles called by user {interaction.user.id} in guild {interaction.guild_id} with unicycle_ids '{unicycle_ids}', user {user.id} and due_in_days {due_in_days}")
+
+        if not interaction.guild_id:
+            await respond(interaction, "This command can only be used in a server!", ephemeral=True)
+            return
+
+        session = session_for(interaction.guild_id)
+        try:
+            unicycles = await self.load_unicycles(interaction, session, unicycle_ids)
+            if unicycles is None:
+                return
+
+            # Check permissions once for the whole batch
+            not_held = [unicycle for unicycle in unicycles if unicycle.custody_id_str != str(interaction.user.id)]
+            if not_held and not await self.is_admin(interaction, session):
+                await respond(
+                    interaction,
+                    "You don't have permission to transfer " + self.describe_unicycles(not_held) + "!", 
+                    ephemeral=True
+                )
+                return
+
+            # One confirmation for all of them, tied to the versions they have now
+            view = TransferConfirmation(
+                self,
+                interaction.guild_id,
+                user,
+                {unicycle.id: unicycle.version for unicycle in unicycles},
+                f"{len(unicycles)} unicycles",
+                due_in_days
+            )
+            loan_text = f" for {due_in_days} day{'s' if due_in_days != 1 else ''}" if due_in_days else ""
+            # The reply may have been deferred ephemerally, so the prompt the target
+            # must see goes to the channel and errors above stay private
+            if interaction.channel is None:
+                await respond(interaction, "Could not post the transfer request in this channel.", ephemeral=True)
+                return
+            try:
+                await interaction.channel.send(
+                    f"{user.mention}, {interaction.user.mention} wants to transfer {len(unicycles)} unicycles to you{loan_text}: "
+                    f"{self.describe_unicycles(unicycles)}. Do you accept?",
+                    view=view
+                )
+            except discord.HTTPException as e:
+                print(f"Failed to post transfer request: {e}")
+                await respond(interaction, "Could not post the transfer request in this channel. Please check my permissions.", ephemeral=True)
+                return
+            await respond(interaction, f"Transfer request for {len(unicycles)} unicycles sent to {user.mention}.", ephemeral=True)
+        except Exception as e:
+            await respond(interaction, f"Error transferring unicycles: {str(e)}", ephemeral=True)
+        finally:
+            session.close()
+
+    @app_commands.command(name="edit-unicycles", description="Change the owner of several unicycles at once")
+    @app_commands.describe(
+        unicycle_ids="The unicycle numbers, e.g. '1, 3, 5-8'",
+        owner="The new owner of the unicycles",
+        is_club_owned="Set to True to make these club-owned unicycles"
+    )
+    @deferred()
+    async def edit_unicycles(
+        self,
+        interaction: discord.Interaction,
+        unicycle_ids: str,
+        owner: discord.Member | None = None,
+        is_club_owned: bool = False
+    ):
+        # Debug statements:
+        print(f"edit_unicycles called by user {interaction.user.id} in guild {interaction.guild_id} with unicycle_ids '{unicycle_ids}', owner '{owner}', is_club_owned {is_club_owned}")
+
+        if not interaction.guild_id:
+            await respond(interaction, "This command can only be used in a server!", ephemeral=True)
+            return
+
+        if is_club_owned and owner:
+            await respond(interaction, "Cannot set both owner and club ownership. Please use only one option.", ephemeral=True)
+            return
+        if not is_club_owned and owner is None:
+            await respond(interaction, "No new owner specified.", ephemeral=True)
+            return
+
+        session = session_for(interaction.guild_id)
+        try:
+            unicycles = await self.load_unicycles(interaction, session, unicycle_ids)
+            if unicycles is None:
+                return
+
+            # Check permissions once for the whole batch
+            user_is_admin = await self.is_admin(interaction, session)
+            if is_club_owned and not user_is_admin:
+                await respond(interaction, "Only administrators can set ownership to Club!", ephemeral=True)
+                return
+            not_owned = [unicycle for unicycle in unicycles if unicycle.owner_id_str != str(interaction.user.id)]
+            if not_owned and not user_is_admin:
+                await respond(
+                    interaction,
+                    "You don't have permission to edit " + self.describe_unicycles(not_owned) + "!", 
+                    ephemeral=True
+                )
+                return
+
+            # Apply every ownership change in one transaction, or none if any unicycle changed meanwhile
+            new_owner_id = "Club" if is_club_owned else str(owner.id)
+            labels = [unicycle_label(unicycle.guild_specific_id, unicycle.name_str) for unicycle in unicycles]
+            for unicycle in unicycles:
+                changes = ownership_changes(unicycle, new_owner_id, str(interaction.user.id))
+                if not compare_and_swap(session, unicycle, unicycle.version, **changes):
+                    session.rollback()
+                    await respond(
+                        interaction,
+                        f"Unicycle #{unicycle.guild_specific_id} was changed by someone else in the meantime, so nothing was updated. Please try again.", 
+                        ephemeral=True
+                    )
+                    return
+            session.commit()
+
+            new_owner = "Club" if is_club_owned else owner.mention
+            for label in labels:
+                events.publish(interaction.guild_id, "edited", f"{interaction.user.mention} gave {label} to {new_owner}")
+
+            await respond(
+                interaction,
+                f"Updated owner of {len(unicycles)} unicycles to " + ("Club" if is_club_owned else str(owner)) + ".", 
+                ephemeral=True
+            )
+        except Exception as e:
+            await respond(interaction, f"Error editing unicycles: {str(e)}", ephemeral=True)
+        finally:
+            session.close()
+
+    @app_commands.command(name="add-unicycle-photo", description="Attach a photo to a unicycle")
+    @app_commands.describe(
+        unicycle_id="The unicycle number (as shown in the list)",
+        photo="The photo to attach (replaces any existing photo)"
+    )
+    @app_commands.autocomplete(unicycle_id=unicycle_autocomplete)
+    @deferred()
+    async def add_unicycle_photo(self, interaction: discord.Interaction, unicycle_id: int, photo: discord.Attachment):
+        # Debug statements:
+        print(f"add_unicycle_photo called by user {interaction.user.id} in guild {interaction.guild_id} with unicycle_id {unicycle_id} and photo '{photo.filename}' ({photo.size} bytes)")
+
+        if not interaction.guild_id:
+            await respond(interaction, "This command can only be used in a server!", ephemeral=True)
+            return
+
+        if not (photo.content_type or "").startswith("image/"):
+            await respond(interaction, "Please attach an image file!", ephemeral=True)
+            return
+        if photo.size > MAX_PHOTO_BYTES:
+            await respond(interaction, f"Photos can be at most {MAX_PHOTO_BYTES // (1024 * 1024)} MB!", ephemeral=True)
+            return
+
+        session = session_for(interaction.guild_id)
+        try:
+            unicycle = session.query(Unicycle).filter_by(
+                guild_specific_id=unicycle_id,
+                guild_id=str(interaction.guild_id)
+            ).first()
+
+            if not unicycle:
+                await respond(interaction, "Unicycle not found in this server!", ephemeral=True)
+                return
+
+            # Check if user has permission to edit
+            if not (str(interaction.user.id) == unicycle.owner_id_str or await self.is_admin(interaction, session)):
+                await respond(interaction, "You don't have permission to edit this unicycle!", ephemeral=True)
+                return
+
+            expected_version = unicycle.version
+            old_photo_hash = unicycle.photo_hash
+            label = unicycle_label(unicycle_id, unicycle.name_str)
+
+            try:
+                photo_hash, _ = await store_photo(photo.url)
+            except PhotoTooLarge:
+                await respond(interaction, f"Photos can be at most {MAX_PHOTO_BYTES // (1024 * 1024)} MB!", ephemeral=True)
+                return
+            await generate_thumbnail(photo_hash)
+
+            if not compare_and_swap(session, unicycle, expected_version, photo_hash=photo_hash):
+                session.rollback()
+                release_photo(photo_hash)
+                await respond(
+                    interaction,
+                    f"Unicycle #{unicycle_id} was changed by someone else while the photo was uploading. Please try again.", 
+                    ephemeral=True
+                )
+                return
+            session.commit()
+            if old_photo_hash:
+                release_photo(old_photo_hash)
+            events.publish(
+                interaction.guild_id, "edited",
+                f"{interaction.user.mention} added a photo to {label}"
+            )
+
+            await respond(interaction, f"Photo added to unicycle #{unicycle_id}!", ephemeral=True)
+        except Exception as e:
+            await respond(interaction, f"Error adding photo: {str(e)}", ephemeral=True)
+        finally:
+            session.close()
+
     @app_commands.command(name="view-unicycle", description="View details of a specific unicycle")
     @app_commands.describe(unicycle_id="The unicycle number (as shown in the list)")
     @app_commands.autocomplete(unicycle_id=unicycle_autocomplete)
+    @deferred()
     async def view_unicycle(self, interaction: discord.Interaction, unicycle_id: int):
         # Debug statements:
         print(f"view_unicycle called by user {interaction.user.id} in guild {interaction.guild_id} with unicycle_id {unicycle_id}")
 
         if not interaction.guild_id:
-            await interaction.response.send_message("This command can only be used in a server!", ephemeral=True)
+            await respond(interaction, "This command can only be used in a server!", ephemeral=True)
             return
             
-        session = Session()
+        session = session_for(interaction.guild_id)
         try:
             # Get the unicycle by its guild-specific ID
             unicycle = session.query(Unicycle).filter_by(
@@ -232,7 +615,7 @@ class UnicycleCommands(commands.Cog):
             ).first()
             
             if not unicycle:
-                await interaction.response.send_message("Unicycle not found in this server!", ephemeral=True)
+                await respond(interaction, "Unicycle not found in this server!", ephemeral=True)
                 return
 
             owner = await self.bot.fetch_user(int(unicycle.owner_id_str)) if unicycle.owner_id_str != "Club" else "Club"
@@ -241,21 +624,92 @@ class UnicycleCommands(commands.Cog):
             embed = discord.Embed(title=unicycle.name_str, description=unicycle.description_str, color=discord.Color.blue())
             embed.add_field(name="Owner", value=str(owner), inline=True)
             embed.add_field(name="Current Custody", value=custody.mention, inline=True)
-            
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+            if unicycle.due_at:
+                overdue = " (overdue)" if unicycle.due_at <= utcnow() else ""
+                embed.add_field(name="Due Back", value=f"{unicycle.due_at:%Y-%m-%d %H:%M} UTC{overdue}", inline=True)
+
+            # Show the photo's thumbnail, falling back to the photo itself if no thumbnail could be made
+            photo_file = None
+            if unicycle.photo_hash:
+                for path in (thumbnail_path(unicycle.photo_hash), photo_path(unicycle.photo_hash)):
+                    if path.exists():
+                        photo_file = discord.File(path, filename="thumbnail.png")
+                        embed.set_thumbnail(url="attachment://thumbnail.png")
+                        break
+
+            if photo_file:
+                await respond(interaction, embed=embed, file=photo_file, ephemeral=True)
+            else:
+                await respond(interaction, embed=embed, ephemeral=True)
         except Exception as e:
-            await interaction.response.send_message(f"Error viewing unicycle: {str(e)}", ephemeral=True)
+            await respond(interaction, f"Error viewing unicycle: {str(e)}", ephemeral=True)
         finally:
             session.close()
 
+    async def display_user(self, user_id: str, mention: bool = False) -> str:
+        """Name or mention of a user, preferring the bot's user cache over an API call"""
+        try:
+            user = self.bot.get_user(int(user_id)) or await self.bot.fetch_user(int(user_id))
+            return user.mention if mention else str(user)
+        except:
+            return f"Unknown User ({user_id})"
+
+    async def render_unicycle_list(self, query, title: str, page: int) -> dict:
+        """Run a list query and render one page of it as a message payload"""
+        total = query.count()
+        if not total:
+            return {'content': "No unicycles found matching your filters!"}
+
+        pages = (total + LIST_PAGE_SIZE - 1) // LIST_PAGE_SIZE
+        if page > pages:
+            return {'content': f"There {'is' if pages == 1 else 'are'} only {pages} page{'' if pages == 1 else 's'} of unicycles matching your filters!"}
+
+        # Get filtered results
+        unicycles = (
+            query.order_by(Unicycle.guild_specific_id)
+            .offset((page - 1) * LIST_PAGE_SIZE)
+            .limit(LIST_PAGE_SIZE)
+            .all()
+        )
+
+        embed = discord.Embed(title=title, color=discord.Color.blue())
+        
+        for unicycle in unicycles:
+            # Get owner information
+            owner_display = "Club"
+            if unicycle.owner_id_str != "Club":
+                owner_display = await self.display_user(unicycle.owner_id_str)
+            
+            # Get custody information
+            custody_display = await self.display_user(unicycle.custody_id_str, mention=True)
+            
+            # Format the field value with ownership and custody info
+            field_value = []
+            field_value.append(f"Owner: {owner_display}")
+            field_value.append(f"Custody: {custody_display}")
+            if unicycle.description_str:
+                field_value.append(f"Description: {unicycle.description_str}")
+            
+            embed.add_field(
+                name=f"#{unicycle.guild_specific_id}: {unicycle.name_str}",
+                value="\n".join(field_value),
+                inline=False
+            )
+
+        if pages > 1:
+            embed.set_footer(text=f"Page {page} of {pages} ({total} unicycles)")
+        return {'embed': embed.to_dict()}
+
     @app_commands.command(name="list-unicycles", description="List unicycles in this server with optional filters")
     @app_commands.describe(
         owner="Filter by owner (mention a user)",
         club_owned="Show only club-owned unicycles",
         in_custody_of="Filter by who has custody (mention a user)",
         search_text="Filter by text in name or description",
-        show_all="Show all unicycles, even if filters are set (admin only)"
+        show_all="Show all unicycles, even if filters are set (admin only)",
+        page="Page of results to show (25 unicycles per page)"
     )
+    @deferred()
     async def list_unicycles(
         self, 
         interaction: discord.Interaction,
@@ -263,16 +717,17 @@ class UnicycleCommands(commands.Cog):
         club_owned: bool = False,
         in_custody_of: discord.Member | None = None,
         search_text: str | None = None,
-        show_all: bool = False
+        show_all: bool = False,
+        page: app_commands.Range[int, 1] = 1
     ):
         # Debug statements:
-        print(f"list_unicycles called by user {interaction.user.id} in guild {interaction.guild_id} with filters: owner={owner}, club_owned={club_owned}, in_custody_of={in_custody_of}, search_text='{search_text}', show_all={show_all}")
+        print(f"list_unicycles called by user {interaction.user.id} in guild {interaction.guild_id} with filters: owner={owner}, club_owned={club_owned}, in_custody_of={in_custody_of}, search_text='{search_text}', show_all={show_all}, page={page}")
 
         if not interaction.guild_id:
-            await interaction.response.send_message("This command can only be used in a server!", ephemeral=True)
+            await respond(interaction, "This command can only be used in a server!", ephemeral=True)
             return
             
-        session = Session()
+        session = session_for(interaction.guild_id)
         try:
             from sqlalchemy import or_, and_, not_
             
@@ -283,7 +738,8 @@ class UnicycleCommands(commands.Cog):
             filters = []
             
             # Apply filters (unless show_all is True and user is admin)
-            if show_all and await self.is_admin(interaction, session):
+            show_everything = show_all and await self.is_admin(interaction, session)
+            if show_everything:
                 filters.append("showing all")
             else:
                 if owner:
@@ -310,57 +766,118 @@ class UnicycleCommands(commands.Cog):
                         )
                     )
                     filters.append(f'matching "{search_text}"')
-            
-            # Get filtered results
-            unicycles = query.order_by(Unicycle.guild_specific_id).all()
-            
-            if not unicycles:
-                await interaction.response.send_message(
-                    "No unicycles found matching your filters!", 
-                    ephemeral=True
-                )
-                return
 
             # Create embed title based on filters
             title = "Unicycles"
             if filters:
                 title += f" ({', '.join(filters)})"
-                
-            embed = discord.Embed(title=title, color=discord.Color.blue())
-            
-            for unicycle in unicycles:
-                # Get owner information
-                owner_display = "Club"
-                if unicycle.owner_id_str != "Club":
-                    try:
-                        owner_user = await self.bot.fetch_user(int(unicycle.owner_id_str))
-                        owner_display = str(owner_user)
-                    except:
-                        owner_display = f"Unknown User ({unicycle.owner_id_str})"
-                
-                # Get custody information
-                try:
-                    custody = await self.bot.fetch_user(int(unicycle.custody_id_str))
-                    custody_display = custody.mention
-                except:
-                    custody_display = f"Unknown User ({unicycle.custody_id_str})"
-                
-                # Format the field value with ownership and custody info
-                field_value = []
-                field_value.append(f"Owner: {owner_display}")
-                field_value.append(f"Custody: {custody_display}")
-                if unicycle.description_str:
-                    field_value.append(f"Description: {unicycle.description_str}")
-                
+
+            # Identical listings are served from the render cache until the guild's data changes
+            guild_id = str(interaction.guild_id)
+            filter_key = (
+                show_everything,
+                owner.id if owner else None,
+                club_owned,
+                in_custody_of.id if in_custody_of else None,
+                search_text,
+                title
+            )
+            cache_key = (guild_id, filter_key, page, guild_data_version(guild_id))
+            payload = self.list_cache.get(cache_key)
+            if payload is None:
+                payload = await self.render_unicycle_list(query, title, page)
+                self.list_cache.put(cache_key, payload)
+
+            if 'embed' in payload:
+                await respond(interaction, embed=discord.Embed.from_dict(payload['embed']), ephemeral=True)
+            else:
+                await respond(interaction, payload['content'], ephemeral=True)
+        except Exception as e:
+            await respond(interaction, f"Error listing unicycles: {str(e)}", ephemeral=True)
+        finally:
+            session.close()
+
+    @app_commands.command(name="overdue-unicycles", description="List lent unicycles that are past their due date")
+    @deferred()
+    async def overdue_unicycles(self, interaction: discord.Interaction):
+        # Debug statements:
+        print(f"overdue_unicycles called by user {interaction.user.id} in guild {interaction.guild_id}")
+
+        if not interaction.guild_id:
+            await respond(interaction, "This command can only be used in a server!", ephemeral=True)
+            return
+
+        session = session_for(interaction.guild_id)
+        try:
+            # Served by the due_at index rather than a scan of the guild's unicycles
+            overdue = session.query(Unicycle).filter(
+                Unicycle.guild_id == str(interaction.guild_id),
+                Unicycle.due_at <= utcnow()
+            ).order_by(Unicycle.due_at).limit(LIST_PAGE_SIZE).all()
+
+            if not overdue:
+                await respond(interaction, "No unicycles are overdue!", ephemeral=True)
+                return
+
+            embed = discord.Embed(title="Overdue Unicycles", color=discord.Color.orange())
+            for unicycle in overdue:
                 embed.add_field(
                     name=f"#{unicycle.guild_specific_id}: {unicycle.name_str}",
-                    value="\n".join(field_value),
+                    value=f"With <@{unicycle.custody_id_str}>, due {unicycle.due_at:%Y-%m-%d %H:%M} UTC",
                     inline=False
                 )
-            
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+            await respond(interaction, embed=embed, ephemeral=True)
         except Exception as e:
-            await interaction.response.send_message(f"Error listing unicycles: {str(e)}", ephemeral=True)
+            await respond(interaction, f"Error listing overdue unicycles: {str(e)}", ephemeral=True)
+        finally:
+            session.close()
+
+    @app_commands.command(name="unicycle-stats", description="Show inventory statistics for this server")
+    @deferred()
+    async def unicycle_stats(self, interaction: discord.Interaction):
+        # Debug statements:
+        print(f"unicycle_stats called by user {interaction.user.id} in guild {interaction.guild_id}")
+
+        if not interaction.guild_id:
+            await respond(interaction, "This command can only be used in a server!", ephemeral=True)
+            return
+
+        guild_id = str(interaction.guild_id)
+        session = session_for(interaction.guild_id)
+        try:
+            stats = inventory_stats(session, guild_id)
+            # Guilds from before the counters existed get them built on first use
+            if not stats['total'] and rebuild_inventory_counters(session, guild_id):
+                session.commit()
+                stats = inventory_stats(session, guild_id)
+
+            if not stats['total']:
+                await respond(interaction, "No unicycles have been added in this server yet!", ephemeral=True)
+                return
+
+            def top_users(counts: dict, limit: int = 10) -> str:
+                # Club ownership is already shown in its own field
+                ranked = sorted(
+                    ((user_id, count) for user_id, count in counts.items() if user_id != "Club"),
+                    key=lambda item: item[1],
+                    reverse=True
+                )
+                lines = [f"<@{user_id}>: {count}" for user_id, count in ranked[:limit]]
+                if len(ranked) > limit:
+                    lines.append(f"...and {len(ranked) - limit} more")
+                return "\n".join(lines) or "None"
+
+            embed = discord.Embed(title="Unicycle Stats", color=discord.Color.blue())
+            embed.add_field(name="Total", value=str(stats['total']), inline=True)
+            embed.add_field(name="Club-owned", value=str(stats['ownership'].get('club', 0)), inline=True)
+            embed.add_field(name="Member-owned", value=str(stats['ownership'].get('member', 0)), inline=True)
+            embed.add_field(name="Member-owned, with someone else", value=str(stats['away']), inline=False)
+            embed.add_field(name="Owners", value=top_users(stats['owner']), inline=True)
+            embed.add_field(name="Custodians", value=top_users(stats['custody']), inline=True)
+
+            await respond(interaction, embed=embed, ephemeral=True)
+        except Exception as e:
+            await respond(interaction, f"Error getting unicycle stats: {str(e)}", ephemeral=True)
         finally:
             session.close()
 
@@ -390,7 +907,7 @@ class UnicycleCommands(commands.Cog):
             )
             return
             
-        session = Session()
+        session = session_for(interaction.guild_id)
         try:
             # Get the unicycle by its guild-specific ID
             unicycle = session.query(Unicycle).filter_by(
@@ -418,10 +935,15 @@ class UnicycleCommands(commands.Cog):
             
             # Store unicycle details for the confirmation message
             unicycle_name = unicycle.name_str
+            photo_hash = unicycle.photo_hash
             
             # Remove the unicycle
             session.delete(unicycle)
+            track_unicycle_change(session, unicycle.guild_id_str, (unicycle.owner_id_str, unicycle.custody_id_str), None)
             session.commit()
+            if photo_hash:
+                release_photo(photo_hash)
+            events.publish(interaction.guild_id, "removed", f"{interaction.user.mention} removed {unicycle_label(unicycle_id, unicycle_name)}")
             
             await interaction.response.send_message(
                 f"Successfully removed unicycle #{unicycle_id}: {unicycle_name}", 
@@ -461,7 +983,7 @@ class UnicycleCommands(commands.Cog):
             await interaction.response.send_message("This command can only be used in a server!", ephemeral=True)
             return
             
-        session = Session()
+        session = session_for(interaction.guild_id)
         try:
             # Check that the unicycle exists and belongs to this guild
             unicycle = session.query(Unicycle).filter_by(
@@ -496,13 +1018,17 @@ class UnicycleCommands(commands.Cog):
 
             # Track what fields are being updated
             updates = []
+            changes = {}
+            # Version the edit is based on, so a racing transfer or edit isn't overwritten
+            expected_version = unicycle.version
+            original_name = unicycle.name_str
             
             if name is not None:
-                unicycle.set_name(name)
+                changes['name'] = name
                 updates.append("name")
                 
             if description is not None:
-                unicycle.set_description(description)
+                changes['description'] = description
                 updates.append("description")
                 
             # Handle ownership changes
@@ -534,20 +1060,24 @@ class UnicycleCommands(commands.Cog):
                     )
                     return
                 
-                unicycle.set_owner_id(new_owner_id)
-                
-                # If the current custodian is the old owner, update custody to the new owner
-                if unicycle.custody_id_str == unicycle.owner_id_str:
-                    if new_owner_id != "Club":  # Only update custody if the new owner isn't Club
-                        unicycle.set_custody_id(new_owner_id)
-                    else:
-                        # If setting to Club ownership, set custody to the person making the change
-                        unicycle.set_custody_id(str(interaction.user.id))
+                changes.update(ownership_changes(unicycle, new_owner_id, str(interaction.user.id)))
                 
                 updates.append("owner to " + ("Club" if is_club_owned else str(owner)))
 
             if updates:
+                if not compare_and_swap(session, unicycle, expected_version, **changes):
+                    session.rollback()
+                    await interaction.response.send_message(
+                        f"Unicycle #{unicycle_id} was changed by someone else while you were editing it. Please check its details and try again.", 
+                        ephemeral=True
+                    )
+                    return
                 session.commit()
+                events.publish(
+                    interaction.guild_id, "edited",
+                    f"{interaction.user.mention} edited {unicycle_label(unicycle_id, original_name)}: "
+                    + ", ".join("name to **" + discord.utils.escape_markdown(name) + "**" if update == "name" else update for update in updates)
+                )
                 # Create a nice message about what was updated
                 update_msg = "Updated " + ", ".join(updates)
                 await interaction.response.send_message(
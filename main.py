@@ -52,8 +52,9 @@ async def on_ready():
         # Calculate needed permissions:
         # VIEW_CHANNELS (1 << 10) = 1024
         # SEND_MESSAGES (1 << 11) = 2048
+        # EMBED_LINKS (1 << 14) = 16384
         # MANAGE_ROLES (1 << 28) = 268435456
-        permissions = 1024 + 2048 + 268435456
+        permissions = 1024 + 2048 + 16384 + 268435456
         
         invite_url = f"https://discord.com/api/oauth2/authorize?client_id={bot.user.id}&permissions={permissions}&scope=bot%20applications.commands"
         print(f"\nLogged in as {bot.user} (ID: {bot.user.id})")
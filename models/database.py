@@ -1,6 +1,12 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, create_engine, UniqueConstraint
+import os
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, create_engine, UniqueConstraint, inspect, text, update, select, insert, delete, func, literal_column, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.orm import relationship, sessionmaker, Session as OrmSession
 
 Base = declarative_base()
 
@@ -33,6 +39,7 @@ class GuildSequence(Base):
     
     guild_id = Column(String, primary_key=True)
     last_value = Column(Integer, default=0, nullable=False)
+    data_version = Column(Integer, default=0, nullable=False, server_default='0')  # Bumped on every unicycle change in the guild
 
 class Unicycle(Base):
     __tablename__ = 'unicycles'
@@ -44,6 +51,10 @@ class Unicycle(Base):
     description = Column(String)
     owner_id = Column(String, nullable=False)  # Discord User ID or "Club"
     custody_id = Column(String, nullable=False)  # Discord User ID
+    version = Column(Integer, nullable=False, default=1, server_default='1')  # Bumped on every change, see compare_and_swap
+    due_at = Column(DateTime, index=True)  # When a lent unicycle should be returned (UTC), if it was lent with a due date
+    reminded_at = Column(DateTime)  # When the custodian was reminded about due_at
+    photo_hash = Column(String)  # SHA-256 of the unicycle's photo in the photo store, see Photo
     
     # Make name and guild-specific ID unique within each guild
     __table_args__ = (
@@ -98,7 +109,9 @@ class Unicycle(Base):
             'name': self.name_str,
             'description': self.description_str,
             'owner_id': self.owner_id_str,
-            'custody_id': self.custody_id_str
+            'custody_id': self.custody_id_str,
+            'version': self.version,
+            'due_at': self.due_at.isoformat() if self.due_at else None
         }
 
 class AdminRole(Base):
@@ -111,9 +124,621 @@ class AdminRole(Base):
     # Make role_id unique within each guild
     __table_args__ = (UniqueConstraint('guild_id', 'role_id', name='_guild_role_uc'),)
 
+class InventoryCounter(Base):
+    __tablename__ = 'inventory_counters'
+
+    # Running per-guild totals kept in step with the unicycles table, see track_unicycle_change
+    guild_id = Column(String, primary_key=True)  # Discord Guild/Server ID
+    dimension = Column(String, primary_key=True)  # "total", "ownership", "owner", "custody" or "away"
+    key = Column(String, primary_key=True, default='')  # User ID, "club"/"member", or "" for single counters
+    count = Column(Integer, nullable=False, default=0)
+
+class GuildSettings(Base):
+    __tablename__ = 'guild_settings'
+
+    guild_id = Column(String, primary_key=True)  # Discord Guild/Server ID
+    feed_channel_id = Column(String)  # Channel that receives the inventory activity feed, if any
+    api_enabled = Column(Boolean, nullable=False, default=False, server_default='0')  # Whether the inventory API may serve this guild
+
+# Bot-wide bookkeeping that always lives in the shared database, even in per-guild mode
+ControlBase = declarative_base()
+
+class PendingPurge(ControlBase):
+    __tablename__ = 'pending_purges'
+
+    guild_id = Column(String, primary_key=True)  # Guild the bot was removed from
+    left_at = Column(DateTime, nullable=False)
+    purge_after = Column(DateTime, nullable=False)  # End of the retention window
+
+class Photo(ControlBase):
+    __tablename__ = 'photos'
+
+    # Content-addressed photo files are shared by every guild, so references are counted here
+    hash = Column(String, primary_key=True)  # SHA-256 of the file contents
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    acquired_at = Column(DateTime, nullable=False)  # Last time a reference was added
+
+class GuildEpoch(ControlBase):
+    __tablename__ = 'guild_epochs'
+
+    # Bumped when a guild's rows are purged. It outlives the purge, so data versions never repeat
+    guild_id = Column(String, primary_key=True)
+    epoch = Column(Integer, nullable=False, default=0)
+
+def utcnow() -> datetime:
+    """Current UTC time as a naive datetime, which is how SQLite stores them"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+# Last committed data version per guild, so readers can check for changes without a query
+_guild_versions = {}
+_guild_versions_lock = threading.Lock()
+_guild_version_invalidations = 0  # Lets a reload tell whether a commit raced it
+
+def bump_guild_version(session, guild_id: str) -> None:
+    """Mark the guild's data as changed. Takes effect when the session commits"""
+    stmt = sqlite_insert(GuildSequence).values(guild_id=guild_id, last_value=0, data_version=1)
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=['guild_id'],
+        set_={'data_version': GuildSequence.data_version + 1}
+    ))
+    session.info.setdefault('changed_guilds', set()).add(guild_id)
+
+@event.listens_for(OrmSession, 'after_commit')
+def _forget_committed_guild_versions(session) -> None:
+    # The next guild_data_version() call reloads the new version from the database
+    global _guild_version_invalidations
+    changed = session.info.pop('changed_guilds', ())
+    if not changed:
+        return
+    with _guild_versions_lock:
+        _guild_version_invalidations += 1
+        for guild_id in changed:
+            _guild_versions.pop(guild_id, None)
+
+@event.listens_for(OrmSession, 'after_rollback')
+def _discard_rolled_back_guild_versions(session) -> None:
+    session.info.pop('changed_guilds', None)
+
+def forget_guild_version(guild_id: str) -> None:
+    """Drop a guild's cached data version after changes that bypass the session hooks"""
+    global _guild_version_invalidations
+    with _guild_versions_lock:
+        _guild_version_invalidations += 1
+        _guild_versions.pop(guild_id, None)
+
+def start_guild_epoch(guild_id: str) -> None:
+    """Move a guild to a new epoch, so versions after a purge are newer than any before it"""
+    session = Session()
+    try:
+        stmt = sqlite_insert(GuildEpoch).values(guild_id=guild_id, epoch=1)
+        session.execute(stmt.on_conflict_do_update(index_elements=['guild_id'], set_={'epoch': GuildEpoch.epoch + 1}))
+        session.commit()
+    finally:
+        session.close()
+    forget_guild_version(guild_id)
+
+def guild_data_version(guild_id: str) -> int:
+    """Current data version of a guild, answered from memory when nothing changed since the last call.
+
+    The purge epoch is kept in the high bits, since a purge deletes the
+    guild's sequence row and its data_version starts again from zero.
+    """
+    with _guild_versions_lock:
+        if guild_id in _guild_versions:
+            return _guild_versions[guild_id]
+        invalidations = _guild_version_invalidations
+
+    session = Session()
+    try:
+        guild_epoch = session.get(GuildEpoch, guild_id)
+        epoch = guild_epoch.epoch if guild_epoch else 0
+    finally:
+        session.close()
+    session = session_for(guild_id)
+    try:
+        sequence = session.get(GuildSequence, guild_id)
+        version = (epoch << 32) + (sequence.data_version if sequence else 0)
+    finally:
+        session.close()
+
+    with _guild_versions_lock:
+        if _guild_version_invalidations == invalidations:
+            _guild_versions[guild_id] = version
+    return version
+
+def inventory_keys(owner_id: str, custody_id: str) -> list[tuple[str, str]]:
+    """The counters a unicycle with this owner and custodian contributes to"""
+    keys = [('total', ''), ('owner', owner_id), ('custody', custody_id)]
+    if owner_id == "Club":
+        keys.append(('ownership', 'club'))
+    else:
+        keys.append(('ownership', 'member'))
+        if custody_id != owner_id:
+            keys.append(('away', ''))
+    return keys
+
+def track_unicycle_change(session, guild_id: str, before: tuple[str, str] | None, after: tuple[str, str] | None) -> None:
+    """Record an added, edited or removed unicycle in the same transaction as the change.
+
+    `before` and `after` are (owner_id, custody_id) pairs, None for a unicycle
+    that didn't exist before or doesn't exist after. The guild's data version
+    is bumped and the inventory counters are adjusted by the difference.
+    """
+    bump_guild_version(session, guild_id)
+
+    delta = Counter()
+    if before:
+        delta.subtract(inventory_keys(*before))
+    if after:
+        delta.update(inventory_keys(*after))
+
+    changed = [(dimension, key, amount) for (dimension, key), amount in delta.items() if amount]
+    for dimension, key, amount in changed:
+        stmt = sqlite_insert(InventoryCounter).values(guild_id=guild_id, dimension=dimension, key=key, count=amount)
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=['guild_id', 'dimension', 'key'],
+            set_={'count': InventoryCounter.count + amount}
+        ))
+    if changed:
+        session.execute(delete(InventoryCounter).where(InventoryCounter.guild_id == guild_id, InventoryCounter.count <= 0))
+
+def compare_and_swap(session, unicycle: 'Unicycle', expected_version: int, **values) -> bool:
+    """Update a unicycle only if it is still at `expected_version`.
+
+    Issues `UPDATE ... WHERE id=? AND version=?` and bumps the version, so two
+    writers working from the same read cannot overwrite each other. Returns
+    False without changing anything if the row was modified (or removed) in
+    the meantime. A custody change ends any loan unless a new `due_at` is
+    given. The caller is responsible for committing.
+    """
+    if 'custody_id' in values and 'due_at' not in values:
+        values['due_at'] = None
+    if 'due_at' in values:
+        values['reminded_at'] = None
+    before = (unicycle.owner_id_str, unicycle.custody_id_str)
+    result = session.execute(
+        update(Unicycle)
+        .where(Unicycle.id == unicycle.id, Unicycle.version == expected_version)
+        .values(version=Unicycle.version + 1, **values)
+    )
+    if result.rowcount != 1:
+        return False
+
+    # The row matched expected_version, so `unicycle` held its state before the update
+    after = (values.get('owner_id', before[0]), values.get('custody_id', before[1]))
+    track_unicycle_change(session, unicycle.guild_id_str, before, after)
+    return True
+
+def add_missing_columns(engine, metadata=Base.metadata) -> None:
+    """Add columns introduced after a database file was created.
+
+    create_all() only creates missing tables, so new columns and indexes on
+    existing tables are added here. New columns must be nullable or have a
+    server default.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.server_default is not None:
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                    ddl += f" DEFAULT '{column.server_default.arg}'"
+                connection.execute(text(ddl))
+                print(f"Added column {table.name}.{column.name}")
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
+
+def guild_tables() -> list:
+    """Tables whose rows belong to a single guild"""
+    return [table for table in Base.metadata.sorted_tables if 'guild_id' in table.c]
+
+# Storage mode: "shared" keeps every guild in unicycles.db, "per_guild" gives
+# each guild its own SQLite file so busy guilds don't serialize each other's writes
+DB_MODE = os.getenv('UNICYCLE_DB_MODE', 'shared')
+GUILD_DB_DIR = Path(os.getenv('UNICYCLE_GUILD_DB_DIR', 'guild_dbs'))
+MAX_OPEN_GUILD_DBS = int(os.getenv('UNICYCLE_MAX_OPEN_GUILD_DBS', '64'))
+
+class GuildEnginePool:
+    """LRU of open per-guild SQLite engines, created lazily with the full schema"""
+
+    def __init__(self, directory: Path, max_open: int):
+        self.directory = directory
+        self.max_open = max_open
+        self._engines = OrderedDict()  # guild_id -> (engine, session factory)
+        self._lock = threading.Lock()
+
+    def path_for(self, guild_id: str) -> Path:
+        if not guild_id.isdigit():
+            raise ValueError(f"Invalid guild ID: {guild_id!r}")
+        return self.directory / f"{guild_id}.db"
+
+    def _open(self, guild_id: str, create: bool = True):
+        with self._lock:
+            if guild_id in self._engines:
+                self._engines.move_to_end(guild_id)
+                return self._engines[guild_id]
+
+            path = self.path_for(guild_id)
+            if not create and not path.exists():
+                return None
+            self.directory.mkdir(parents=True, exist_ok=True)
+            guild_engine = create_engine(f"sqlite:///{path}")
+            Base.metadata.create_all(guild_engine)
+            add_missing_columns(guild_engine)
+            entry = (guild_engine, sessionmaker(bind=guild_engine))
+            self._engines[guild_id] = entry
+
+            # Close the least recently used engines beyond the limit
+            while len(self._engines) > self.max_open:
+                _, (old_engine, _) = self._engines.popitem(last=False)
+                old_engine.dispose()
+            return entry
+
+    def engine(self, guild_id: str):
+        return self._open(guild_id)[0]
+
+    def session_factory(self, guild_id: str, create: bool = True):
+        """Session factory for a guild's file, or None if it has none and `create` is False"""
+        entry = self._open(guild_id, create)
+        return entry[1] if entry else None
+
+    def guild_ids(self) -> list[str]:
+        """IDs of all guilds that have a database file"""
+        if not self.directory.exists():
+            return []
+        return sorted(path.stem for path in self.directory.glob("*.db") if path.stem.isdigit())
+
+    def drop(self, guild_id: str) -> bool:
+        """Close and delete a guild's database file. Returns False if it had none"""
+        path = self.path_for(guild_id)
+        with self._lock:
+            entry = self._engines.pop(guild_id, None)
+            if entry:
+                entry[0].dispose()
+            if not path.exists():
+                return False
+            path.unlink()
+            return True
+
 # Create database and tables
 engine = create_engine('sqlite:///unicycles.db')
 Base.metadata.create_all(engine)
+ControlBase.metadata.create_all(engine)
+add_missing_columns(engine)
+add_missing_columns(engine, ControlBase.metadata)
 
 # Create session factory
 Session = sessionmaker(bind=engine)
+
+guild_engines = GuildEnginePool(GUILD_DB_DIR, MAX_OPEN_GUILD_DBS)
+
+def session_for(guild_id, create: bool = True):
+    """Open a session on the database holding the given guild's data.
+
+    Background tasks pass create=False so they don't recreate the file of a
+    purged guild. They get None if the guild has no database file.
+    """
+    if DB_MODE == 'per_guild' and guild_id is not None:
+        factory = guild_engines.session_factory(str(guild_id), create)
+        return factory() if factory else None
+    return Session()
+
+def migrate_shared_to_guild_files(overwrite: bool = False) -> tuple[dict[str, int], list[str]]:
+    """Copy every guild's rows from unicycles.db into its own database file.
+
+    Only runs in shared mode, while unicycles.db is still the live copy.
+    Guilds that already have a file are skipped unless `overwrite` is set,
+    in which case that file's rows are replaced. The shared file is left
+    untouched. Returns rows copied per guild and the guilds skipped.
+    """
+    if DB_MODE == 'per_guild':
+        raise RuntimeError("Guild files are already in use, migrating again would overwrite them")
+
+    copied = {}
+    skipped = []
+    with engine.connect() as source:
+        guild_ids = set()
+        for table in guild_tables():
+            guild_ids.update(row[0] for row in source.execute(select(table.c.guild_id).distinct()))
+
+        for guild_id in sorted(guild_ids):
+            if guild_engines.path_for(guild_id).exists() and not overwrite:
+                skipped.append(guild_id)
+                continue
+            copied[guild_id] = 0
+            with guild_engines.engine(guild_id).begin() as target:
+                for table in guild_tables():
+                    rows = source.execute(select(table).where(table.c.guild_id == guild_id)).mappings().all()
+                    target.execute(delete(table).where(table.c.guild_id == guild_id))
+                    if rows:
+                        target.execute(insert(table), [dict(row) for row in rows])
+                        copied[guild_id] += len(rows)
+            print(f"Migrated {copied[guild_id]} rows for guild {guild_id}")
+    return copied, skipped
+
+def count_guild_rows(guild_id: str) -> dict[str, int]:
+    """Number of rows stored for a guild, per table"""
+    if DB_MODE == 'per_guild':
+        if not guild_engines.path_for(guild_id).exists():
+            return {}
+        source = guild_engines.engine(guild_id)
+    else:
+        source = engine
+
+    with source.connect() as connection:
+        return {
+            table.name: connection.execute(
+                select(func.count()).select_from(table).where(table.c.guild_id == guild_id)
+            ).scalar_one()
+            for table in guild_tables()
+        }
+
+def delete_guild_rows_batch(guild_id: str, batch_size: int) -> tuple[str, int] | None:
+    """Delete up to `batch_size` of a guild's rows from the shared database.
+
+    Each call is its own short transaction so the write lock is only held
+    briefly. Unicycles are deleted first and the guild's sequence and
+    counters last, so a purge that stops early never leaves unicycles
+    without the sequence that numbers them. Returns the table and row count
+    deleted, or None once the guild has no rows left.
+    """
+    purge_order = {'unicycles': 0, 'inventory_counters': 2, 'guild_sequences': 2}
+    with engine.begin() as connection:
+        for table in sorted(guild_tables(), key=lambda table: purge_order.get(table.name, 1)):
+            batch = (
+                select(literal_column('rowid'))
+                .select_from(table)
+                .where(table.c.guild_id == guild_id)
+                .limit(batch_size)
+            )
+            result = connection.execute(delete(table).where(literal_column('rowid').in_(batch)))
+            if result.rowcount:
+                return table.name, result.rowcount
+    return None
+
+def stored_guild_ids() -> set[str]:
+    """IDs of every guild that has data stored"""
+    if DB_MODE == 'per_guild':
+        return set(guild_engines.guild_ids())
+    with engine.connect() as connection:
+        guild_ids = set()
+        for table in guild_tables():
+            guild_ids.update(row[0] for row in connection.execute(select(table.c.guild_id).distinct()))
+        return guild_ids
+
+def begin_write(session) -> None:
+    """Take the database's write lock for the rest of the session's transaction.
+
+    pysqlite only begins a transaction at the first write, so reads before it
+    can see other commits land in between. Call this before reads that a
+    later write depends on.
+    """
+    dbapi_connection = session.connection().connection.driver_connection
+    # Already writing means the lock is already held
+    if not dbapi_connection.in_transaction:
+        session.execute(text("BEGIN IMMEDIATE"))
+
+def rebuild_inventory_counters(session, guild_id: str) -> bool:
+    """Recompute a guild's inventory counters from the unicycles table.
+
+    Holds the write lock from the first read, so changes committed meanwhile
+    can't be lost. Returns True if the stored counters had drifted from the
+    real totals. The caller is responsible for committing.
+    """
+    begin_write(session)
+    expected = Counter()
+    rows = session.execute(
+        select(Unicycle.owner_id, Unicycle.custody_id, func.count())
+        .where(Unicycle.guild_id == guild_id)
+        .group_by(Unicycle.owner_id, Unicycle.custody_id)
+    ).all()
+    for owner_id, custody_id, count in rows:
+        for key in inventory_keys(owner_id, custody_id):
+            expected[key] += count
+
+    stored = {
+        (counter.dimension, counter.key): counter.count
+        for counter in session.query(InventoryCounter).filter_by(guild_id=guild_id)
+    }
+    if stored == dict(expected):
+        return False
+
+    session.execute(delete(InventoryCounter).where(InventoryCounter.guild_id == guild_id))
+    for (dimension, key), count in expected.items():
+        session.add(InventoryCounter(guild_id=guild_id, dimension=dimension, key=key, count=count))
+    return True
+
+def reconcile_guild_counters(guild_id: str) -> bool:
+    """Rebuild one guild's inventory counters in its own transaction. Returns True if they had drifted"""
+    session = session_for(guild_id)
+    try:
+        drifted = rebuild_inventory_counters(session, guild_id)
+        session.commit()
+        return drifted
+    finally:
+        session.close()
+
+def inventory_stats(session, guild_id: str) -> dict:
+    """A guild's inventory counters, grouped by dimension"""
+    stats = {'total': 0, 'ownership': {}, 'owner': {}, 'custody': {}, 'away': 0}
+    for counter in session.query(InventoryCounter).filter_by(guild_id=guild_id):
+        if counter.dimension in ('total', 'away'):
+            stats[counter.dimension] = counter.count
+        else:
+            stats[counter.dimension][counter.key] = counter.count
+    return stats
+
+def outstanding_loans() -> list[tuple[datetime, str, int]]:
+    """(due_at, guild_id, unicycle id) of every loan whose custodian hasn't been reminded yet"""
+    loans = []
+    guild_ids = stored_guild_ids() if DB_MODE == 'per_guild' else [None]
+    for guild_id in guild_ids:
+        session = session_for(guild_id, create=False)
+        if session is None:
+            continue  # Purged since it was listed
+        try:
+            loans.extend(
+                (due_at, loan_guild_id, unicycle_id) for due_at, loan_guild_id, unicycle_id in session.execute(
+                    select(Unicycle.due_at, Unicycle.guild_id, Unicycle.id)
+                    .where(Unicycle.due_at.is_not(None), Unicycle.reminded_at.is_(None))
+                )
+            )
+        finally:
+            session.close()
+    return loans
+
+def claim_reminder(session, unicycle_id: int, due_at: datetime) -> bool:
+    """Mark a loan's reminder as sent, if nobody did yet and the due date is unchanged.
+
+    Doesn't bump the unicycle's version, so pending transfers stay valid.
+    Returns False if the reminder is no longer owed. The caller commits.
+    """
+    result = session.execute(
+        update(Unicycle)
+        .where(Unicycle.id == unicycle_id, Unicycle.due_at == due_at, Unicycle.reminded_at.is_(None))
+        .values(reminded_at=utcnow())
+    )
+    return result.rowcount == 1
+
+def release_reminder(session, unicycle_id: int, due_at: datetime) -> None:
+    """Undo claim_reminder after a reminder couldn't be delivered. The caller commits"""
+    session.execute(
+        update(Unicycle)
+        .where(Unicycle.id == unicycle_id, Unicycle.due_at == due_at)
+        .values(reminded_at=None)
+    )
+
+def acquire_photo(photo_hash: str, size: int) -> None:
+    """Count a new reference to a stored photo"""
+    session = Session()
+    try:
+        now = utcnow()
+        stmt = sqlite_insert(Photo).values(hash=photo_hash, size=size, ref_count=1, acquired_at=now)
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=['hash'],
+            set_={'ref_count': Photo.ref_count + 1, 'acquired_at': now}
+        ))
+        session.commit()
+    finally:
+        session.close()
+
+def release_photo(photo_hash: str) -> None:
+    """Drop a reference to a stored photo. Unreferenced photos are deleted by the garbage collector"""
+    session = Session()
+    try:
+        session.execute(
+            update(Photo).where(Photo.hash == photo_hash, Photo.ref_count > 0).values(ref_count=Photo.ref_count - 1)
+        )
+        session.commit()
+    finally:
+        session.close()
+
+def recount_photo_references(grace: timedelta) -> list[str]:
+    """Recompute every photo's reference count from the unicycles tables.
+
+    Catches references dropped without release_photo, such as guild purges.
+    Photos acquired within `grace` are skipped, as their upload may not be
+    linked to a unicycle yet. Returns the hashes that are no longer referenced.
+    """
+    # Taken before counting, so any photo acquired after the count started is left alone
+    cutoff = utcnow() - grace
+    references = Counter()
+    guild_ids = stored_guild_ids() if DB_MODE == 'per_guild' else [None]
+    for guild_id in guild_ids:
+        session = session_for(guild_id, create=False)
+        if session is None:
+            continue  # Purged since it was listed
+        try:
+            references.update({
+                photo_hash: count for photo_hash, count in session.execute(
+                    select(Unicycle.photo_hash, func.count())
+                    .where(Unicycle.photo_hash.is_not(None))
+                    .group_by(Unicycle.photo_hash)
+                )
+            })
+        finally:
+            session.close()
+
+    session = Session()
+    try:
+        unreferenced = []
+        candidates = session.execute(select(Photo.hash).where(Photo.acquired_at < cutoff)).scalars().all()
+        for photo_hash in candidates:
+            count = references.get(photo_hash, 0)
+            # Re-checked in the UPDATE, so an acquire_photo since the SELECT keeps its reference
+            result = session.execute(
+                update(Photo).where(Photo.hash == photo_hash, Photo.acquired_at < cutoff).values(ref_count=count)
+            )
+            if result.rowcount and not count:
+                unreferenced.append(photo_hash)
+        session.commit()
+        return unreferenced
+    finally:
+        session.close()
+
+def forget_photos(photo_hashes: list[str]) -> list[str]:
+    """Remove rows of unreferenced photos, skipping any referenced again meanwhile.
+
+    Returns the hashes that were removed, whose files can now be deleted.
+    """
+    session = Session()
+    try:
+        forgotten = [
+            photo_hash for photo_hash in photo_hashes
+            if session.execute(delete(Photo).where(Photo.hash == photo_hash, Photo.ref_count <= 0)).rowcount
+        ]
+        session.commit()
+        return forgotten
+    finally:
+        session.close()
+
+def feed_channel_id(guild_id: str) -> str | None:
+    """The guild's activity feed channel, or None if it has no feed"""
+    session = session_for(guild_id, create=False)
+    if session is None:
+        return None
+    try:
+        settings = session.get(GuildSettings, guild_id)
+        return settings.feed_channel_id if settings else None
+    finally:
+        session.close()
+
+def update_guild_settings(guild_id: str, **values) -> None:
+    """Change some of a guild's settings, creating its settings row if needed"""
+    session = session_for(guild_id)
+    try:
+        session.execute(
+            sqlite_insert(GuildSettings)
+            .values(guild_id=guild_id, **values)
+            .on_conflict_do_update(index_elements=['guild_id'], set_=values)
+        )
+        session.commit()
+    finally:
+        session.close()
+
+def set_feed_channel(guild_id: str, channel_id: str | None) -> None:
+    """Set or clear the guild's activity feed channel"""
+    update_guild_settings(guild_id, feed_channel_id=channel_id)
+
+def api_enabled(guild_id: str) -> bool:
+    """Whether the guild has opted in to the inventory API"""
+    session = session_for(guild_id, create=False)
+    if session is None:
+        return False
+    try:
+        settings = session.get(GuildSettings, guild_id)
+        return bool(settings and settings.api_enabled)
+    finally:
+        session.close()
+
+def set_api_enabled(guild_id: str, enabled: bool) -> None:
+    """Opt the guild in to or out of the inventory API"""
+    update_guild_settings(guild_id, api_enabled=enabled)
@@ -0,0 +1,137 @@
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from models.database import engine, guild_engines, guild_tables
+from utils.metrics import metrics
+
+BACKUP_DIR = Path(os.getenv('UNICYCLE_BACKUP_DIR', 'backups'))
+BACKUP_KEEP = int(os.getenv('UNICYCLE_BACKUP_KEEP', '7'))
+BACKUP_INTERVAL_HOURS = float(os.getenv('UNICYCLE_BACKUP_INTERVAL_HOURS', '24'))
+# Pages copied per backup step, and the pause between steps so the bot can write
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_PAUSE = 0.05
+
+def database_files() -> list[tuple[Path, Path]]:
+    """The shared database and every per-guild database file, with their paths inside a snapshot"""
+    shared = Path(engine.url.database)
+    files = [(shared, Path(shared.name))] if shared.exists() else []
+    for guild_id in guild_engines.guild_ids():
+        path = guild_engines.path_for(guild_id)
+        files.append((path, Path(path.parent.name) / path.name))
+    return files
+
+def backup_database(source: Path, target: Path) -> None:
+    """Copy a live database with SQLite's online backup API, a few pages at a time"""
+    source_connection = sqlite3.connect(source)
+    target_connection = sqlite3.connect(target)
+    try:
+        source_connection.backup(target_connection, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_PAUSE)
+    finally:
+        target_connection.close()
+        source_connection.close()
+
+def list_snapshots() -> list[Path]:
+    """Completed snapshots, oldest first"""
+    if not BACKUP_DIR.exists():
+        return []
+    return sorted(path for path in BACKUP_DIR.iterdir() if path.is_dir() and not path.name.endswith(".partial"))
+
+def rotate_snapshots(keep: int = BACKUP_KEEP) -> list[Path]:
+    """Delete all but the newest `keep` snapshots, and leftovers of interrupted ones.
+
+    Snapshots are taken one at a time, so any .partial directory still around
+    when this runs belongs to a run that crashed. Returns the deleted snapshots.
+    """
+    for leftover in BACKUP_DIR.glob("*.partial"):
+        shutil.rmtree(leftover, ignore_errors=True)
+    snapshots = list_snapshots()
+    expired = snapshots[:-keep] if keep > 0 else snapshots
+    for snapshot in expired:
+        shutil.rmtree(snapshot)
+    return expired
+
+def create_snapshot() -> Path:
+    """Back up every database file into a new timestamped snapshot directory.
+
+    Blocking; run it from a worker thread. The snapshot is written under a
+    .partial name and renamed once complete, so a crash never leaves a
+    half-written snapshot that looks finished.
+    """
+    start = time.monotonic()
+    # Microseconds keep snapshots taken within the same second apart
+    name = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+    partial = BACKUP_DIR / f"{name}.partial"
+    BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+    partial.mkdir()
+
+    snapshot = BACKUP_DIR / name
+    try:
+        for source, relative in database_files():
+            target = partial / relative
+            target.parent.mkdir(parents=True, exist_ok=True)
+            backup_database(source, target)
+        partial.rename(snapshot)
+    except Exception:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    rotate_snapshots()
+
+    metrics.incr("backup.snapshots")
+    metrics.observe("backup.duration", time.monotonic() - start)
+    print(f"Created backup snapshot {snapshot}")
+    return snapshot
+
+def count_rows_per_guild(path: Path) -> dict[str, dict[str, int]]:
+    """Row counts per guild and table in a database file, opened read-only"""
+    counts = {}
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        for table in guild_tables():
+            try:
+                rows = connection.execute(f"SELECT guild_id, COUNT(*) FROM {table.name} GROUP BY guild_id").fetchall()
+            except sqlite3.OperationalError:
+                continue  # Table didn't exist yet when this snapshot was taken
+            for guild_id, count in rows:
+                counts.setdefault(guild_id, {})[table.name] = count
+    finally:
+        connection.close()
+    return counts
+
+def verify_snapshot(snapshot: Path) -> dict:
+    """Open every file in a snapshot, run an integrity check and compare row counts per guild with the live data.
+
+    Reports (snapshot, live) row counts per file, guild and table. Differences
+    are expected for guilds that changed since the snapshot was taken; a
+    failed integrity check is not.
+    """
+    live_files = {relative: source for source, relative in database_files()}
+    report = {'files': {}, 'errors': []}
+
+    for snapshot_file in sorted(snapshot.rglob("*.db")):
+        relative = snapshot_file.relative_to(snapshot)
+        connection = sqlite3.connect(f"file:{snapshot_file}?mode=ro", uri=True)
+        try:
+            result = connection.execute("PRAGMA quick_check").fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            result = str(e)
+        finally:
+            connection.close()
+        if result != "ok":
+            report['errors'].append(f"{relative}: {result}")
+            continue
+
+        snapshot_counts = count_rows_per_guild(snapshot_file)
+        live_file = live_files.get(relative)
+        live_counts = count_rows_per_guild(live_file) if live_file else {}
+        report['files'][str(relative)] = {
+            guild_id: {
+                table_name: (count, live_counts.get(guild_id, {}).get(table_name, 0))
+                for table_name, count in tables.items()
+            }
+            for guild_id, tables in snapshot_counts.items()
+        }
+
+    return report
@@ -0,0 +1,62 @@
+import asyncio
+import functools
+import time
+import discord
+from utils.metrics import metrics
+
+# Discord drops interactions that are not acknowledged within 3 seconds.
+# Commands that are still running after this many seconds get deferred.
+DEFAULT_LATENCY_BUDGET = 1.5
+
+def deferred(budget: float = DEFAULT_LATENCY_BUDGET, ephemeral: bool = True):
+    """Decorator for slash command callbacks that may run past Discord's deadline.
+
+    If the command has not responded once `budget` seconds have passed, the
+    interaction is deferred and later replies made through `respond` are
+    delivered as followups. Place it directly above the `async def`, below
+    the `app_commands` decorators.
+    """
+    def decorator(func):
+        command_name = func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(self, interaction: discord.Interaction, *args, **kwargs):
+            interaction.extras['response_lock'] = asyncio.Lock()
+            interaction.extras['deferred'] = False
+            timer = asyncio.create_task(_defer_after(interaction, budget, ephemeral))
+            start = time.monotonic()
+            try:
+                return await func(self, interaction, *args, **kwargs)
+            finally:
+                timer.cancel()
+                metrics.incr(f"commands.{command_name}.invocations")
+                metrics.observe(f"commands.{command_name}.latency", time.monotonic() - start)
+                if interaction.extras['deferred']:
+                    metrics.incr(f"commands.{command_name}.deferred")
+
+        return wrapper
+    return decorator
+
+async def _defer_after(interaction: discord.Interaction, budget: float, ephemeral: bool) -> None:
+    await asyncio.sleep(budget)
+    async with interaction.extras['response_lock']:
+        if interaction.response.is_done():
+            return
+        try:
+            await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+            interaction.extras['deferred'] = True
+            print(f"Deferred interaction {interaction.id} after {budget}s latency budget")
+        except discord.HTTPException as e:
+            print(f"Failed to defer interaction {interaction.id}: {e}")
+
+async def respond(interaction: discord.Interaction, content: str | None = None, **kwargs) -> None:
+    """Send a reply, using the followup webhook if the interaction was already acknowledged"""
+    lock = interaction.extras.get('response_lock')
+    if lock is None:
+        lock = interaction.extras['response_lock'] = asyncio.Lock()
+
+    async with lock:
+        if interaction.response.is_done():
+            await interaction.followup.send(content, **kwargs)
+        else:
+            await interaction.response.send_message(content, **kwargs)
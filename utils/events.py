@@ -0,0 +1,40 @@
+import time
+from utils.metrics import metrics
+
+class InventoryEvent:
+    """A committed change to a guild's unicycles"""
+
+    def __init__(self, guild_id: str, kind: str, summary: str):
+        self.guild_id = guild_id
+        self.kind = kind  # "added", "edited", "removed" or "transferred"
+        self.summary = summary  # One line of Discord markdown describing the change
+        self.timestamp = time.time()
+
+class EventBus:
+    """In-process fan-out of inventory changes to subscribers.
+
+    Subscribers are plain callables run on the event loop. They should only
+    queue the event and return, so publishing never waits on Discord.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, callback) -> None:
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def publish(self, guild_id, kind: str, summary: str) -> None:
+        """Announce a change. Call only after the change has been committed"""
+        event = InventoryEvent(str(guild_id), kind, summary)
+        metrics.incr(f"events.{kind}")
+        for callback in list(self._subscribers):
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Error delivering {kind} event for guild {event.guild_id}: {e}")
+
+events = EventBus()
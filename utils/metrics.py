@@ -0,0 +1,49 @@
+import threading
+from collections import defaultdict, deque
+
+# Number of recent samples kept per timing metric for percentile reporting
+SAMPLE_WINDOW = 1000
+
+class Metrics:
+    """In-process counters and timing samples for operational stats"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._samples = defaultdict(lambda: deque(maxlen=SAMPLE_WINDOW))
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        """Increase a named counter"""
+        with self._lock:
+            self._counters[name] += amount
+
+    def observe(self, name: str, value: float) -> None:
+        """Record a timing sample (in seconds) for a named metric"""
+        with self._lock:
+            self._samples[name].append(value)
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> dict:
+        """Returns counters and p50/p95/p99/max of the recent timing samples"""
+        with self._lock:
+            counters = dict(self._counters)
+            samples = {name: sorted(values) for name, values in self._samples.items() if values}
+
+        timings = {}
+        for name, values in samples.items():
+            def percentile(p: float) -> float:
+                return values[min(len(values) - 1, int(p * len(values)))]
+            timings[name] = {
+                'count': len(values),
+                'p50': percentile(0.50),
+                'p95': percentile(0.95),
+                'p99': percentile(0.99),
+                'max': values[-1]
+            }
+        return {'counters': counters, 'timings': timings}
+
+# Shared registry used by the cogs
+metrics = Metrics()
@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+import aiohttp
+from models.database import acquire_photo, forget_photos, recount_photo_references
+from utils.metrics import metrics
+from utils.thumbnails import make_thumbnail
+
+PHOTO_DIR = Path(os.getenv('UNICYCLE_PHOTO_DIR', 'photos'))
+MAX_PHOTO_BYTES = 10 * 1024 * 1024
+THUMBNAIL_SIZE = (256, 256)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Photos and upload leftovers are only collected once they are this old,
+# so uploads that are still being linked to a unicycle are left alone
+GARBAGE_GRACE = timedelta(hours=1)
+
+_thumbnail_pool = None
+
+class PhotoTooLarge(Exception):
+    pass
+
+def photo_path(photo_hash: str) -> Path:
+    return PHOTO_DIR / photo_hash[:2] / photo_hash
+
+def thumbnail_path(photo_hash: str) -> Path:
+    return PHOTO_DIR / photo_hash[:2] / f"{photo_hash}.thumb.png"
+
+async def generate_thumbnail(photo_hash: str) -> bool:
+    """Create the photo's thumbnail in the process pool, off the event loop"""
+    global _thumbnail_pool
+    target = thumbnail_path(photo_hash)
+    if target.exists():
+        return True
+    if _thumbnail_pool is None:
+        # Forking would copy the event loop, worker threads and open SQLite connections
+        _thumbnail_pool = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn"))
+
+    # Write under a temporary name so a half-written thumbnail is never served
+    partial = target.with_name(f"{target.name}.{uuid.uuid4().hex}.tmp")
+    loop = asyncio.get_running_loop()
+    try:
+        created = await loop.run_in_executor(_thumbnail_pool, make_thumbnail, str(photo_path(photo_hash)), str(partial), THUMBNAIL_SIZE)
+    except Exception as e:
+        print(f"Failed to create thumbnail for photo {photo_hash}: {e}")
+        partial.unlink(missing_ok=True)
+        return False
+    if created:
+        partial.replace(target)
+    return created
+
+def shutdown_thumbnail_pool() -> None:
+    """Stop the thumbnail worker processes. They are started again on next use"""
+    global _thumbnail_pool
+    if _thumbnail_pool is not None:
+        _thumbnail_pool.shutdown(wait=False, cancel_futures=True)
+        _thumbnail_pool = None
+
+async def store_photo(url: str) -> tuple[str, int]:
+    """Stream a photo into the content-addressed store and count a reference to it.
+
+    Returns the photo's SHA-256 and size. A photo that is already stored is
+    only kept once. Raises PhotoTooLarge beyond MAX_PHOTO_BYTES.
+    """
+    temp_dir = PHOTO_DIR / "tmp"
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    temp_path = temp_dir / uuid.uuid4().hex
+    hasher = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiohttp.ClientSession() as http:
+            async with http.get(url) as response:
+                response.raise_for_status()
+                with open(temp_path, "wb") as file:
+                    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > MAX_PHOTO_BYTES:
+                            raise PhotoTooLarge()
+                        hasher.update(chunk)
+                        file.write(chunk)
+
+        photo_hash = hasher.hexdigest()
+        target = photo_path(photo_hash)
+        if target.exists():
+            metrics.incr("photos.deduplicated")
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            temp_path.replace(target)
+            metrics.incr("photos.stored")
+        # No await between the file check and the reference, so garbage collection can't slip in
+        acquire_photo(photo_hash, size)
+        return photo_hash, size
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+async def collect_photo_garbage() -> int:
+    """Delete photos no unicycle refers to any more. Returns the number of files removed"""
+    unreferenced = await asyncio.to_thread(recount_photo_references, GARBAGE_GRACE)
+    removed = 0
+    # Rows and files are removed together on the event loop, so a concurrent upload either keeps its row or re-creates the file
+    for photo_hash in forget_photos(unreferenced):
+        photo_path(photo_hash).unlink(missing_ok=True)
+        thumbnail_path(photo_hash).unlink(missing_ok=True)
+        removed += 1
+
+    # Files left behind by interrupted uploads
+    cutoff = time.time() - GARBAGE_GRACE.total_seconds()
+    if PHOTO_DIR.exists():
+        for path in (PHOTO_DIR / "tmp").glob("*"):
+            if path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+                removed += 1
+    metrics.incr("photos.collected", removed)
+    return removed
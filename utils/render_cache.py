@@ -0,0 +1,49 @@
+from collections import OrderedDict
+from utils.metrics import metrics
+
+class RenderCache:
+    """Bounded LRU of rendered message payloads, keyed per guild and data version.
+
+    Keys are tuples starting with (guild_id, ..., data_version). Storing an
+    entry for a newer version drops the guild's entries for older versions,
+    since those can never be hit again.
+    """
+
+    def __init__(self, name: str, max_entries: int):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._keys_by_guild = {}
+
+    def get(self, key: tuple):
+        payload = self._entries.get(key)
+        if payload is None:
+            metrics.incr(f"render_cache.{self.name}.misses")
+            return None
+        self._entries.move_to_end(key)
+        metrics.incr(f"render_cache.{self.name}.hits")
+        return payload
+
+    def put(self, key: tuple, payload) -> None:
+        guild_id, version = key[0], key[-1]
+        guild_keys = self._keys_by_guild.setdefault(guild_id, set())
+        for stale in [k for k in guild_keys if k[-1] < version]:
+            guild_keys.discard(stale)
+            self._entries.pop(stale, None)
+
+        self._entries[key] = payload
+        self._entries.move_to_end(key)
+        guild_keys.add(key)
+
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            metrics.incr(f"render_cache.{self.name}.evictions")
+            evicted_keys = self._keys_by_guild.get(evicted[0])
+            if evicted_keys is not None:
+                evicted_keys.discard(evicted)
+                if not evicted_keys:
+                    del self._keys_by_guild[evicted[0]]
+
+    def invalidate_guild(self, guild_id: str) -> None:
+        for key in self._keys_by_guild.pop(guild_id, ()):
+            self._entries.pop(key, None)
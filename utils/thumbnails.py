@@ -0,0 +1,13 @@
+# Runs in the thumbnail worker processes, which import only this module,
+# so keep it free of database and Discord imports
+
+def make_thumbnail(source: str, target: str, size: tuple[int, int]) -> bool:
+    """Write a PNG thumbnail of an image"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return False
+    with Image.open(source) as image:
+        image.thumbnail(size)
+        image.save(target, format="PNG")
+    return True